@@ -0,0 +1,88 @@
+"""
+Several Reddit accounts (script apps) sharing the work of one run.
+
+Reddit rate-limits each OAuth client separately, so with more than one
+registered script app the aggregate throughput grows with every client.
+Accounts are read from an INI file with one section per account (the keys
+of a praw.ini section) or from numbered environment variables. ClientPool
+gives each of them its own Reddit instances, session and rate budget, and
+hands every unit of work (a comment tree or a batch of "load more comments")
+to the client that can send a request soonest, so work moves away from a
+client while Reddit throttles it.
+"""
+
+import configparser
+import os
+import re
+import threading
+
+ACCOUNT_KEYS = ("client_id", "client_secret", "username", "password")
+NUMBERED_CLIENT_ID = re.compile(r"REDDIT_CLIENT_ID_(\d+)")
+
+
+def load_accounts(path=None, environ=None):
+    """Returns the accounts of an INI file, or of REDDIT_CLIENT_ID_<n> (etc.) variables.
+
+    Each account is a dict with a ``name`` (the section name or <n>), the
+    ACCOUNT_KEYS and an optional ``user_agent``. Without a file and numbered
+    variables the list is empty. Raises ValueError for incomplete accounts.
+    """
+    accounts = []
+    if path:
+        parser = configparser.ConfigParser(interpolation=None)
+        if not parser.read(path, encoding='utf-8'):
+            raise ValueError(f"Cannot read the accounts file {path}")
+        for section in parser.sections():
+            accounts.append(dict(parser[section], name=section))
+    else:
+        environ = os.environ if environ is None else environ
+        numbers = sorted({int(match.group(1)) for match in map(NUMBERED_CLIENT_ID.fullmatch, environ) if match})
+        for number in numbers:
+            account = {key: environ.get(f"REDDIT_{key.upper()}_{number}") for key in ACCOUNT_KEYS + ("user_agent",)}
+            accounts.append(dict(((key, value) for key, value in account.items() if value is not None), name=str(number)))
+    for account in accounts:
+        missing = [key for key in ACCOUNT_KEYS if not account.get(key)]
+        if missing:
+            raise ValueError(f"Account {account['name']} is missing {', '.join(missing)}")
+    return accounts
+
+
+class ClientPool:
+    """Per-thread Reddit instances of several accounts, each drawing from its own rate budget.
+
+    ``create_reddit(index)`` creates a Reddit instance for account ``index``
+    whose session uses ``budgets[index]``. PRAW instances are not
+    thread-safe, so every thread gets its own instance per account.
+    """
+
+    def __init__(self, budgets, create_reddit):
+        self.budgets = budgets
+        self._create_reddit = create_reddit
+        self._assigned = [0] * len(budgets) # Units of work handed to each client
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def client(self, index):
+        """The calling thread's Reddit instance for account ``index``."""
+        instances = self._local.__dict__.setdefault("instances", {})
+        if index not in instances:
+            instances[index] = self._create_reddit(index)
+        return instances[index]
+
+    def instances(self):
+        """The calling thread's Reddit instances created so far, by account index."""
+        return dict(self._local.__dict__.get("instances", {}))
+
+    def _choose(self):
+        """The client whose next request would wait least; ties go to the least used relative to its pace."""
+        if len(self.budgets) == 1:
+            return 0
+        waits = [budget.wait_estimate() for budget in self.budgets]
+        with self._lock:
+            index = min(range(len(self.budgets)), key=lambda i: (waits[i], self._assigned[i] / self.budgets[i].rate))
+            self._assigned[index] += 1
+        return index
+
+    def reddit(self):
+        """A Reddit instance of the client best placed to take the next unit of work."""
+        return self.client(self._choose())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Local SQLite archive shared by all downloaders.
+
+Submissions and comments are upserted into a normalized schema keyed on
+their Reddit IDs, so overlapping runs deduplicate themselves and queries
+such as "all comments by u/X" hit an index instead of scanning JSON files.
+The export command rebuilds the downloaders' JSON layout from the archive.
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    subreddit TEXT NOT NULL,
+    title TEXT,
+    author TEXT,
+    url TEXT,
+    permalink TEXT,
+    created_utc REAL,
+    score INTEGER,
+    upvote_ratio REAL,
+    selftext TEXT,
+    num_comments INTEGER,
+    fetched_at TEXT
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    link_id TEXT NOT NULL REFERENCES submissions(id),
+    parent_id TEXT,
+    subreddit TEXT NOT NULL,
+    author TEXT,
+    body TEXT,
+    score INTEGER,
+    created_utc REAL,
+    permalink TEXT,
+    position INTEGER,
+    fetched_at TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_subreddit_created ON submissions (subreddit, created_utc);
+CREATE INDEX IF NOT EXISTS submissions_author ON submissions (author);
+CREATE INDEX IF NOT EXISTS submissions_created ON submissions (created_utc);
+CREATE INDEX IF NOT EXISTS comments_link ON comments (link_id, position);
+CREATE INDEX IF NOT EXISTS comments_parent ON comments (parent_id);
+CREATE INDEX IF NOT EXISTS comments_subreddit_created ON comments (subreddit, created_utc);
+CREATE INDEX IF NOT EXISTS comments_author ON comments (author);
+CREATE INDEX IF NOT EXISTS comments_created ON comments (created_utc);
+"""
+
+UPSERT_SUBMISSION = """
+INSERT INTO submissions (id, subreddit, title, author, url, permalink, created_utc, score, upvote_ratio, selftext, num_comments, fetched_at)
+VALUES (:id, :subreddit, :title, :author, :url, :permalink, :created_utc, :score, :upvote_ratio, :selftext, :num_comments, :fetched_at)
+ON CONFLICT (id) DO UPDATE SET
+    title = excluded.title,
+    author = COALESCE(excluded.author, submissions.author),
+    url = excluded.url,
+    permalink = excluded.permalink,
+    score = excluded.score,
+    upvote_ratio = excluded.upvote_ratio,
+    selftext = excluded.selftext,
+    num_comments = COALESCE(excluded.num_comments, submissions.num_comments),
+    fetched_at = excluded.fetched_at
+"""
+
+UPSERT_COMMENT = """
+INSERT INTO comments (id, link_id, parent_id, subreddit, author, body, score, created_utc, permalink, position, fetched_at)
+VALUES (:id, :link_id, :parent_id, :subreddit, :author, :body, :score, :created_utc, :permalink, :position, :fetched_at)
+ON CONFLICT (id) DO UPDATE SET
+    parent_id = COALESCE(excluded.parent_id, comments.parent_id),
+    author = excluded.author,
+    body = excluded.body,
+    score = excluded.score,
+    permalink = excluded.permalink,
+    position = COALESCE(excluded.position, comments.position),
+    fetched_at = excluded.fetched_at
+"""
+
+# A refetched comment tree is numbered afresh; comments no longer in it keep no position
+CLEAR_POSITIONS = "UPDATE comments SET position = NULL WHERE link_id = ?"
+
+BATCH_SIZE = 50 # Posts per write transaction
+
+
+def connect(archive_file):
+    """Opens (and if needed creates) the archive in WAL mode."""
+    db = sqlite3.connect(archive_file)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+class ArchiveWriter:
+    """Output writer that upserts every post and its comments into the archive.
+
+    Writes are batched into one transaction per BATCH_SIZE posts. Posts from
+    the user downloader carry no author, so the header's username is used.
+    Comments carry their parent_id, which the output layouts leave out.
+    Each post's comments are numbered in fetch order; comments that are gone
+    from a refetched tree are kept without a position, after the others.
+    """
+
+    archive_fields = True # Receives the ARCHIVE_COMMENT_FIELDS from a TeeWriter
+
+    def __init__(self, archive_file, header):
+        self.archive_file = archive_file
+        self._db = connect(archive_file)
+        self._subreddit = header["subreddit"]
+        self._author = header.get("username")
+        self._fetched_at = header["download_time"]
+        self._pending = 0
+
+    def write_post(self, post_info):
+        row = {
+            "subreddit": self._subreddit,
+            "author": self._author,
+            "num_comments": None,
+            "fetched_at": self._fetched_at,
+        }
+        row.update((key, value) for key, value in post_info.items() if key != "comments")
+        self._db.execute(UPSERT_SUBMISSION, row)
+        if post_info.get("comments"): # Missing from posts-only records, empty if the tree failed to download
+            self._db.execute(CLEAR_POSITIONS, (post_info["id"],))
+        self._db.executemany(UPSERT_COMMENT, (
+            dict(comment, parent_id=comment.get("parent_id"), link_id=post_info["id"], subreddit=self._subreddit, position=position, fetched_at=self._fetched_at)
+            for position, comment in enumerate(post_info.get("comments", ()))
+        ))
+        self._pending += 1
+        if self._pending >= BATCH_SIZE:
+            self._db.commit()
+            self._pending = 0
+
+    def write_user_comments(self, comments):
+        """Upserts comments that arrive without their post (a user's comments)."""
+        self._db.executemany(UPSERT_COMMENT, (
+            dict(comment, link_id=comment["link_id"].split("_", 1)[-1], subreddit=self._subreddit, position=None, fetched_at=self._fetched_at)
+            for comment in comments
+        ))
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def abort(self):
+        # Every post written so far is complete, so keep it
+        self.close()
+
+
+def export(db, subreddit, author=None, start_timestamp=None, end_timestamp=None, days=None):
+    """Rebuilds the downloaders' JSON layout from the archive.
+
+    With ``author`` the result matches reddit_downloader.py, with a date range
+    reddit_subreddit_downloader_daterange.py, with ``days``
+    reddit_subreddit_downloader.py; otherwise every archived post is exported.
+    """
+    where = ["subreddit = ? COLLATE NOCASE"]
+    params = [subreddit]
+    if author is not None:
+        where.append("author = ?")
+        params.append(author)
+    if days is not None:
+        start_timestamp = datetime.now(timezone.utc).timestamp() - days * 24 * 60 * 60
+    if start_timestamp is not None:
+        where.append("created_utc >= ?")
+        params.append(start_timestamp)
+    if end_timestamp is not None:
+        where.append("created_utc <= ?")
+        params.append(end_timestamp)
+
+    posts = []
+    download_time = None
+    for row in db.execute(f"SELECT * FROM submissions WHERE {' AND '.join(where)} ORDER BY created_utc DESC, id DESC", params):
+        download_time = max(download_time or row["fetched_at"], row["fetched_at"])
+        post_info = {
+            "id": row["id"],
+            "title": row["title"],
+            "author": row["author"],
+            "url": row["url"],
+            "permalink": row["permalink"],
+            "created_utc": row["created_utc"],
+            "score": row["score"],
+            "upvote_ratio": row["upvote_ratio"],
+            "selftext": row["selftext"],
+            "num_comments": row["num_comments"],
+            "comments": [
+                {
+                    "id": comment["id"],
+                    "author": comment["author"],
+                    "body": comment["body"],
+                    "score": comment["score"],
+                    "created_utc": comment["created_utc"],
+                    "permalink": comment["permalink"]
+                }
+                for comment in db.execute("SELECT * FROM comments WHERE link_id = ? ORDER BY position IS NULL, position, id", (row["id"],))
+            ]
+        }
+        if author is not None:
+            # The user downloader's layout has no author or comment count per post
+            del post_info["author"], post_info["num_comments"]
+        posts.append(post_info)
+
+    if author is not None:
+        header = {"username": author, "subreddit": subreddit}
+    elif days is not None:
+        header = {"subreddit": subreddit, "time_period_days": days}
+    elif end_timestamp is not None:
+        header = {
+            "subreddit": subreddit,
+            "start_date": datetime.utcfromtimestamp(start_timestamp).strftime('%Y-%m-%d'),
+            "end_date": datetime.utcfromtimestamp(end_timestamp).strftime('%Y-%m-%d'),
+            "start_timestamp_utc": start_timestamp,
+            "end_timestamp_utc": end_timestamp
+        }
+    else:
+        header = {"subreddit": subreddit}
+    header["download_time"] = download_time
+    return dict(header, posts=posts)
+
+
+def valid_date(s):
+    """Convert YYYY-MM-DD string to UTC timestamp at start of day."""
+    try:
+        dt = datetime.strptime(s, "%Y-%m-%d")
+        return dt.replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        msg = f"Not a valid date: '{s}'. Expected format: YYYY-MM-DD."
+        raise argparse.ArgumentTypeError(msg)
+
+
+def main():
+    """Main function to parse arguments and run an archive command."""
+    parser = argparse.ArgumentParser(description="Work with the SQLite archive written by the downloaders' --archive option.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Rebuild a downloader's JSON output from the archive.")
+    export_parser.add_argument("archive", help="Path to the archive database.")
+    export_parser.add_argument("-o", "--output", required=True, help="Output JSON file name.")
+    export_parser.add_argument("--subreddit", default="selfhosted", help="Subreddit to export. Defaults to selfhosted.")
+    export_parser.add_argument("--author", default=None, help="Only export posts by this user (reddit_downloader.py layout).")
+    export_parser.add_argument("--days", type=int, default=None, help="Only export posts from the last N days (reddit_subreddit_downloader.py layout).")
+    export_parser.add_argument("--start-date", type=valid_date, default=None, help="Start date (inclusive) in YYYY-MM-DD format.")
+    export_parser.add_argument("--end-date", type=valid_date, default=None, help="End date (inclusive) in YYYY-MM-DD format.")
+
+    args = parser.parse_args()
+
+    if (args.start_date is None) != (args.end_date is None):
+        print("Error: --start-date and --end-date must be given together.", file=sys.stderr)
+        sys.exit(1)
+    end_timestamp = args.end_date + (24 * 60 * 60 - 1) if args.end_date is not None else None
+
+    db = connect(args.archive)
+    data = export(db, args.subreddit, args.author, args.start_date, end_timestamp, args.days)
+    db.close()
+
+    print(f"Exporting {len(data['posts'])} posts to {args.output}...")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    print("Data saved successfully.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Comment trees fetched on an asyncio event loop with Async PRAW.
+
+With threads, every in-flight request holds an OS thread, so a handful of
+slow /comments responses stall the run. AsyncCommentFetchPool instead runs
+three overlapping stages: the listing walk (the blocking PRAW generator,
+on a single thread of its own), comment fetching and hydration (one task
+per submission, any number of requests in flight on one thread) and the
+writer (the engine's loop consuming imap()). The stages are connected by a
+bounded queue, so the listing pauses while ``workers`` trees are waiting
+to be written. Every request still draws from the run's RateBudgets, and
+the records are the same as with CommentFetchPool.
+
+Async PRAW is optional (pip install asyncpraw); ASYNC_SUPPORTED tells
+whether it is installed.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from praw.const import API_PATH
+
+from reddit_hydrate import DEFAULT_HYDRATE_WORKERS, CommentTree
+from reddit_metrics import endpoint
+from reddit_workers import MAX_RETRIES, RETRY_STATUSES, backoff_delay
+
+try:
+    import aiohttp
+    import asyncpraw
+    from asyncpraw.models import MoreComments
+except ImportError: # Only needed for --async
+    aiohttp = asyncpraw = MoreComments = None
+ASYNC_SUPPORTED = asyncpraw is not None
+
+
+class AsyncBudgetedSession:
+    """Wraps an aiohttp.ClientSession so every request takes a token from a RateBudget.
+
+    The asynchronous counterpart of BudgetedSession: the wait for a token
+    and the backoff before a retry are asyncio sleeps, so they hold no
+    thread. Every attempt is also timed in ``metrics``, like
+    InstrumentedSession. Pass it to Async PRAW as
+    ``requestor_kwargs={"session": AsyncBudgetedSession(budget, metrics)}``.
+    """
+
+    def __init__(self, budget, metrics=None, session=None):
+        self._budget = budget
+        self._metrics = metrics
+        # Concurrency is bounded by the pool and the rate budget, not by the connector
+        self._session = session or aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                                         timeout=aiohttp.ClientTimeout(total=None))
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    @asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._budget.reserve())
+            start = time.monotonic()
+            status = "error" # Connection failures and timeouts
+            try:
+                response = await self._session.request(method, url, **kwargs)
+                status = response.status
+            finally:
+                if self._metrics is not None:
+                    self._metrics.request(endpoint(method, str(url)), status, time.monotonic() - start)
+            self._budget.update(response.headers)
+            if response.status not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                break
+            delay = backoff_delay(attempt, response.headers.get("retry-after"))
+            response.release()
+            if response.status == 429:
+                self._budget.pause(delay)
+            else:
+                self._budget.count_retry()
+                await asyncio.sleep(delay)
+            attempt += 1
+        try:
+            yield response
+        finally:
+            response.release()
+
+
+def create_async_reddit(account, user_agent, budget, metrics=None, **kwargs):
+    """An Async PRAW instance of ``account`` whose requests draw from ``budget``; call it on the event loop."""
+    return asyncpraw.Reddit(
+        client_id=account["client_id"],
+        client_secret=account["client_secret"],
+        password=account["password"],
+        user_agent=account.get("user_agent") or user_agent,
+        username=account["username"],
+        requestor_kwargs={"session": AsyncBudgetedSession(budget, metrics)},
+        **kwargs,
+    )
+
+
+class AsyncCommentHydrator:
+    """CommentHydrator for Async PRAW: batches are tasks instead of pool threads.
+
+    At most ``workers`` batches are in flight across every submission being
+    fetched, as with CommentHydrator. Each batch asks ``reddit_factory`` for
+    an Async PRAW instance (see ClientPool.reddit).
+    """
+
+    def __init__(self, reddit_factory, workers=DEFAULT_HYDRATE_WORKERS):
+        self._reddit_factory = reddit_factory
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def _more_children(self, submission, children):
+        data = {"children": ",".join(children), "link_id": submission.fullname, "sort": submission.comment_sort}
+        async with self._semaphore:
+            return await self._reddit_factory().post(API_PATH["morechildren"], data=data)
+
+    async def _continue_thread(self, submission, parent_id):
+        path = f"{API_PATH['submission'].format(id=submission.id)}_/{parent_id.split('_', 1)[1]}"
+        async with self._semaphore:
+            _, comments = await self._reddit_factory().get(path, params={"limit": submission.comment_limit, "sort": submission.comment_sort})
+        return list(comments.children[0].replies)
+
+    async def comments(self, submission):
+        """Returns every comment of a submission, flattened breadth-first like comments.list()."""
+        tree = CommentTree(submission, MoreComments)
+        while tree.pending or tree.continued:
+            batches, continued = tree.take()
+            results = await asyncio.gather(*[self._more_children(submission, batch) for batch in batches],
+                                           *[self._continue_thread(submission, parent_id) for parent_id in continued])
+            for result in results:
+                tree.place(result)
+        return tree.flatten()
+
+
+async def expand_comments(submission, hydrator=None):
+    """Every comment of a fetched Async PRAW submission, in comments.list() order."""
+    if hydrator is not None:
+        return await hydrator.comments(submission)
+    await submission.comments.replace_more(limit=None)
+    return submission.comments.list()
+
+
+class AsyncCommentFetchPool:
+    """Fetches comment trees for listed submissions on an event loop thread.
+
+    A drop-in for CommentFetchPool. ``clients`` is a ClientPool of Async
+    PRAW instances, used only on the loop's thread, and
+    ``fetch_comments(submission)`` is a coroutine function returning the
+    comment list of a fetched submission. About ``workers`` trees are in
+    flight at once; each is refetched by ID, so no PRAW object crosses
+    threads.
+    """
+
+    def __init__(self, clients, fetch_comments, workers=1):
+        self._clients = clients
+        self._fetch_comments = fetch_comments
+        self._workers = max(workers, 1)
+        self._listing = ThreadPoolExecutor(max_workers=1) # The blocking listing walk
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.run(self._sign_in())
+
+    async def _sign_in(self):
+        """Signs every account in once, so the first burst of fetches does not race for tokens."""
+        for index in range(len(self._clients.budgets)):
+            await self._clients.client(index).user.me()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def run(self, coroutine):
+        """Runs a coroutine on the pool's loop and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _fetch_by_id(self, submission_id):
+        submission = await self._clients.reddit().submission(id=submission_id)
+        return await self._fetch_comments(submission)
+
+    async def _list(self, submissions, stored_comments, queue):
+        """Listing stage: walks the listing on its thread and starts a fetch task per submission.
+
+        Queues (submission, future) pairs in listing order, then None, or
+        (None, error) if the listing failed.
+        """
+        loop = asyncio.get_running_loop()
+        iterator = iter(submissions)
+        try:
+            while True:
+                submission = await loop.run_in_executor(self._listing, next, iterator, None)
+                if submission is None:
+                    break
+                comments = stored_comments(submission) if stored_comments else None
+                if comments is not None:
+                    future = Future()
+                    future.set_result(comments)
+                else:
+                    future = asyncio.run_coroutine_threadsafe(self._fetch_by_id(submission.id), loop)
+                await queue.put((submission, future))
+        except Exception as e:
+            await queue.put((None, e))
+            return
+        await queue.put(None)
+
+    async def _start(self, submissions, stored_comments):
+        queue = asyncio.Queue(maxsize=self._workers)
+        return queue, asyncio.create_task(self._list(submissions, stored_comments, queue))
+
+    async def _stop(self, queue, listing):
+        """Stops the listing stage and cancels the fetches nobody will collect."""
+        listing.cancel()
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None and item[0] is not None:
+                item[1].cancel()
+
+    def imap(self, submissions, stored_comments=None):
+        """Yields (submission, get_comments) pairs in listing order, like CommentFetchPool.imap().
+
+        Fetches already queued are handed out before a listing error is raised.
+        """
+        queue, listing = self.run(self._start(submissions, stored_comments))
+        try:
+            while True:
+                item = self.run(queue.get())
+                if item is None:
+                    return
+                submission, future = item
+                if submission is None:
+                    raise future
+                yield submission, future.result
+        finally:
+            self.run(self._stop(queue, listing))
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for reddit in self._clients.instances().values():
+            await reddit.close()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.run(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._listing.shutdown(wait=True, cancel_futures=True)
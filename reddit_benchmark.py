@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the downloaders against a recorded cassette, without network access.
+
+Record a cassette once with a downloader's --record option, using the same
+targets as the benchmark, or generate one with reddit_synthetic.py. Each
+scenario then runs fetch_user_data or one of the fetch_subreddit_data
+variants in a fresh process, against a reddit_replay.py server on
+localhost. It reports posts/sec, comments/sec, requests per post, peak RSS
+of the download (taken before the output is read back) and time to the
+first written post, plus the size of the output and the time to load it
+back (json.load or pyarrow.parquet.read_table). Results are medians over
+--repeat runs and can be saved as JSON to compare runs for regressions.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from reddit_hydrate import DEFAULT_HYDRATE_WORKERS
+from reddit_replay import DEFAULT_WINDOW, ReplayServer, replay_environment
+
+UNLIMITED_REQUESTS_PER_MINUTE = 1000000 # Let the replay server's headers do the pacing
+DAY = 24 * 60 * 60
+
+
+def output_files(output_file, output_format):
+    from reddit_output import comments_file
+    files = [output_file, comments_file(output_file)] if output_format == "parquet" else [output_file]
+    return [path for path in files if os.path.exists(path)]
+
+
+def load_output(output_file, output_format):
+    """Loads an output file the way an analysis would, returning the seconds it took."""
+    start = time.monotonic()
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        [pq.read_table(path) for path in output_files(output_file, output_format)]
+    else:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            if output_format == "ndjson":
+                [json.loads(line) for line in f]
+            else:
+                json.load(f)
+    return time.monotonic() - start
+
+
+def run_scenario(scenario):
+    """Runs one scenario in this process (the benchmark child) and returns its measurements."""
+    # Imported here so the replay URLs and dummy credentials in the environment take effect
+    from reddit_accounts import load_accounts
+    from reddit_engine import Engine
+    from reddit_output import read_posts
+    import reddit_downloader
+    import reddit_subreddit_downloader
+    import reddit_subreddit_downloader_daterange
+
+    output_file = scenario["output"]
+    start = time.monotonic()
+    engine = Engine(workers=scenario["workers"], requests_per_minute=scenario["client_rate_limit"], output_format=scenario["format"],
+                    posts_only=scenario["posts_only"], accounts=load_accounts(), hydrate_workers=scenario["hydrate_workers"],
+                    use_async=scenario["use_async"])
+    if scenario["kind"] == "user":
+        reddit_downloader.fetch_user_data(engine, scenario["username"], output_file, scenario["subreddit"])
+    elif scenario["kind"] == "subreddit":
+        reddit_subreddit_downloader.fetch_subreddit_data(engine, output_file, subreddit_name=scenario["subreddit"])
+    else:
+        reddit_subreddit_downloader_daterange.fetch_subreddit_data(engine, scenario["start_timestamp"], scenario["end_timestamp"], output_file, scenario["subreddit"])
+    elapsed = time.monotonic() - start
+    first_record = engine.first_record_at - start if engine.first_record_at is not None else None
+    engine.close()
+    # Before the output is loaded back below, which would otherwise dominate streamed runs
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KB on Linux
+
+    exists = os.path.exists(output_file)
+    load_seconds = load_output(output_file, scenario["format"]) if exists else None
+    posts = list(read_posts(output_file)) if exists else []
+    return {
+        "seconds": elapsed,
+        "posts": len(posts),
+        "comments": sum(len(post.get("comments", ())) for post in posts),
+        "peak_rss_mb": peak_rss_mb,
+        "time_to_first_record": first_record,
+        "output_mb": sum(os.path.getsize(path) for path in output_files(output_file, scenario["format"])) / (1024 * 1024),
+        "load_seconds": load_seconds,
+    }
+
+
+def child_main(spec):
+    scenario = json.loads(spec)
+    # Keep the downloader's progress output out of the result stream
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = run_scenario(scenario)
+    print(json.dumps(result))
+
+
+def run_child(server, scenario, verbose=False):
+    """Runs a scenario in a fresh process against the replay server; adds the server-side counts."""
+    env = replay_environment(server.url, scenario["accounts"])
+    server.reset_counters()
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", json.dumps(scenario)],
+        env=env, stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {describe(scenario)} failed with exit code {completed.returncode} (rerun with -v)")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result.update(requests=server.requests, throttled=server.throttled, errors=server.errors, unmatched=server.unmatched)
+    return result
+
+
+def summarize(results):
+    """Medians of the per-run measurements, plus the derived rates."""
+    median = lambda key: statistics.median(r[key] for r in results) if all(r[key] is not None for r in results) else None
+    seconds = median("seconds")
+    posts, comments, requests = median("posts"), median("comments"), median("requests")
+    return {
+        "runs": len(results),
+        "posts": posts,
+        "comments": comments,
+        "seconds": seconds,
+        "posts_per_sec": posts / seconds if seconds else None,
+        "comments_per_sec": comments / seconds if seconds else None,
+        "requests": requests,
+        "requests_per_post": requests / posts if posts else None,
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in results),
+        "time_to_first_record": median("time_to_first_record"),
+        "output_mb": median("output_mb"),
+        "load_seconds": median("load_seconds"),
+        "throttled": median("throttled"),
+        "errors": median("errors"),
+        "unmatched": median("unmatched"),
+    }
+
+
+def describe(scenario):
+    if scenario["kind"] == "user":
+        return f"fetch_user_data u/{scenario['username']} r/{scenario['subreddit']}"
+    if scenario["kind"] == "subreddit":
+        return f"fetch_subreddit_data r/{scenario['subreddit']} (30 days)"
+    return f"fetch_subreddit_data r/{scenario['subreddit']} {scenario['start_date']} to {scenario['end_date']}"
+
+
+def format_number(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def main():
+    """Main function to parse arguments and run the benchmark scenarios."""
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        child_main(sys.argv[2])
+        return
+
+    from reddit_engine import valid_date
+
+    parser = argparse.ArgumentParser(description="Benchmark the downloaders against a cassette recorded with --record, served from localhost.")
+    parser.add_argument("cassette", help="Cassette recorded with the same targets as the scenarios.")
+    parser.add_argument("--user", action="append", default=[], help="Benchmark fetch_user_data for this user. Can be repeated.")
+    parser.add_argument("--user-subreddit", default="selfhosted", help="Subreddit of the --user scenarios. Defaults to selfhosted.")
+    parser.add_argument("--subreddit", action="append", default=[], help="Benchmark the 30-day fetch_subreddit_data for this subreddit. Can be repeated.")
+    parser.add_argument("--date-range", nargs=3, action="append", default=[], metavar=("SUBREDDIT", "START", "END"), help="Benchmark the date-range fetch_subreddit_data. Can be repeated.")
+    parser.add_argument("--workers", type=int, default=1, help="Comment workers used by every scenario. Defaults to 1.")
+    parser.add_argument("--hydrate-workers", type=int, default=DEFAULT_HYDRATE_WORKERS, help=f"Batched 'load more comments' requests in flight in every scenario. Defaults to {DEFAULT_HYDRATE_WORKERS}.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run every scenario with --async (comment trees fetched with Async PRAW on an event loop).")
+    parser.add_argument("--accounts", type=int, default=1, help="Fake accounts (client IDs) the work is spread over; with --rate-limit each has its own quota. Defaults to 1.")
+    parser.add_argument("--format", choices=("json", "ndjson", "parquet"), default="json", help="Output format used by every scenario. Defaults to json.")
+    parser.add_argument("--posts-only", action="store_true", help="Run every scenario with --posts-only (no comments; one request per 100 listed posts).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; medians are reported. Defaults to 3.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the replay server adds to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds added to every response, at random.")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Requests per --window the replay server allows, with Reddit's rate-limit headers and 429s.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help=f"Length of the replay server's rate-limit window in seconds. Defaults to {DEFAULT_WINDOW}.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests the replay server fails with a 503.")
+    parser.add_argument("--client-rate-limit", type=int, default=UNLIMITED_REQUESTS_PER_MINUTE, help="Requests per minute cap of the downloader itself. Defaults to no practical limit.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and error injection. Defaults to 0.")
+    parser.add_argument("--json", default=None, metavar="PATH", help="Also save the results as JSON.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the downloaders' error output and the server's unmatched requests.")
+    args = parser.parse_args()
+
+    if not args.user and not args.subreddit and not args.date_range:
+        parser.error("Give at least one --user, --subreddit or --date-range scenario.")
+
+    scenarios = [{"kind": "user", "username": username, "subreddit": args.user_subreddit} for username in args.user]
+    scenarios += [{"kind": "subreddit", "subreddit": subreddit} for subreddit in args.subreddit]
+    for subreddit, start_date, end_date in args.date_range:
+        try:
+            start_timestamp, end_timestamp = valid_date(start_date), valid_date(end_date) + (DAY - 1)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        scenarios.append({"kind": "daterange", "subreddit": subreddit, "start_date": start_date, "end_date": end_date,
+                          "start_timestamp": start_timestamp, "end_timestamp": end_timestamp})
+
+    server = ReplayServer(args.cassette, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                          window=args.window, error_rate=args.error_rate, seed=args.seed, verbose=args.verbose).start()
+    print(f"Replaying {args.cassette} at {server.url} ({args.repeat} runs per scenario, {args.workers} workers{' (async)' if args.use_async else ''}, "
+          f"{args.accounts} account{'s' if args.accounts != 1 else ''}, {args.format}{', posts only' if args.posts_only else ''})")
+
+    report = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for scenario in scenarios:
+            scenario.update(workers=args.workers, hydrate_workers=args.hydrate_workers, use_async=args.use_async, accounts=args.accounts,
+                            format=args.format, client_rate_limit=args.client_rate_limit, posts_only=args.posts_only,
+                            output=os.path.join(output_dir, f"output.{args.format}"))
+            results = []
+            for _ in range(args.repeat):
+                for path in output_files(scenario["output"], args.format):
+                    os.remove(path)
+                results.append(run_child(server, scenario, args.verbose))
+            summary = summarize(results)
+            report.append(dict(summary, scenario=describe(scenario)))
+
+            print(f"\n{describe(scenario)}")
+            print(f"  {format_number(summary['posts'], 0)} posts, {format_number(summary['comments'], 0)} comments in {format_number(summary['seconds'], 2)}s")
+            print(f"  posts/sec:            {format_number(summary['posts_per_sec'])}")
+            print(f"  comments/sec:         {format_number(summary['comments_per_sec'])}")
+            print(f"  requests/post:        {format_number(summary['requests_per_post'], 2)}")
+            print(f"  peak RSS:             {format_number(summary['peak_rss_mb'])} MB")
+            print(f"  time to first record: {format_number(summary['time_to_first_record'], 2)}s")
+            print(f"  output size:          {format_number(summary['output_mb'], 2)} MB")
+            print(f"  load time:            {format_number(summary['load_seconds'], 3)}s")
+            if summary["throttled"] or summary["errors"] or summary["unmatched"]:
+                print(f"  server: {format_number(summary['throttled'], 0)} throttled, {format_number(summary['errors'], 0)} injected errors, "
+                      f"{format_number(summary['unmatched'], 0)} requests without a recorded response")
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nResults saved to {args.json}")
+
+if __name__ == "__main__":
+    main()
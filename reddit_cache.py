@@ -0,0 +1,209 @@
+"""
+On-disk cache of Reddit API responses, plugged in under the PRAW session.
+
+Re-running a downloader over the same historical window then serves the
+listing pages and comment payloads from disk instead of spending API quota.
+Entries expire per endpoint (fresh listings quickly, archived threads
+never) and the least recently used ones are evicted beyond a size cap.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+FOREVER = None
+
+# Seconds a response stays valid, per endpoint. Threads that Reddit has
+# archived can no longer change, so their comment payloads never expire.
+DEFAULT_TTLS = {
+    "listing": 5 * 60,
+    "comments": 60 * 60,
+    "morechildren": 60 * 60,
+    "archived": FOREVER,
+}
+DEFAULT_MAX_MB = 500
+EXPIRY_SWEEP_PUTS = 100 # Expired entries are deleted once every this many writes
+EVICT_BATCH = 100 # Least recently used entries deleted per query when over the size cap
+
+# The body is stored decoded, so its transfer headers no longer apply
+UNCACHED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+"""
+
+LISTING_PATH = re.compile(r"/(new|hot|top|rising|controversial|submitted|comments|search)/?$")
+
+
+def classify(method, url):
+    """Returns the cache endpoint for a request, or None if it must not be cached."""
+    path = urlsplit(url).path
+    if method == "POST":
+        # morechildren is a read-only POST; every other POST changes state
+        return "morechildren" if path.rstrip("/").endswith("/api/morechildren") else None
+    if method != "GET" or path.startswith("/api/"):
+        return None
+    if path.startswith("/comments/"):
+        return "comments"
+    if LISTING_PATH.search(path):
+        return "listing"
+    return None
+
+
+def is_archived(body):
+    """True if a /comments/<id> payload belongs to an archived thread."""
+    try:
+        listing = json.loads(body)
+        return bool(listing[0]["data"]["children"][0]["data"].get("archived"))
+    except (ValueError, LookupError, TypeError, AttributeError):
+        return False
+
+
+class ResponseCache:
+    """SQLite-backed LRU response store shared by every session of a run.
+
+    The size of the stored bodies is summed once on open and then kept up to
+    date, so writes never scan the whole table.
+    """
+
+    def __init__(self, cache_file, max_mb=DEFAULT_MAX_MB, ttls=None):
+        self.cache_file = cache_file
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_stored = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_file, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._puts = 0
+
+    def get(self, key):
+        """Returns (status, headers, body) for a fresh entry, counting a hit or a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status, headers, body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[3] is not None and row[3] < now):
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            self.bytes_served += len(row[2])
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key, endpoint, status, headers, body, ttl):
+        now = time.time()
+        expires_at = None if ttl is FOREVER else now + ttl
+        with self._lock:
+            replaced = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, status, json.dumps(headers), body, len(body), expires_at, now),
+            )
+            self._total_bytes += len(body) - (replaced[0] if replaced else 0)
+            self.bytes_stored += len(body)
+            self._puts += 1
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        """Drops expired entries (every EXPIRY_SWEEP_PUTS writes), then least recently used ones until under the size cap."""
+        if self._puts % EXPIRY_SWEEP_PUTS == 0:
+            expired = "FROM responses WHERE expires_at IS NOT NULL AND expires_at < ?"
+            self._total_bytes -= self._db.execute(f"SELECT COALESCE(SUM(size), 0) {expired}", (now,)).fetchone()[0]
+            self._db.execute(f"DELETE {expired}", (now,))
+        while self._total_bytes > self.max_bytes:
+            oldest = self._db.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT ?", (EVICT_BATCH,)).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def ttl_for(self, endpoint, body):
+        if endpoint == "comments" and is_archived(body):
+            return self.ttls["archived"]
+        return self.ttls[endpoint]
+
+    def summary(self):
+        return (f"Response cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_served / 1024 / 1024:.1f} MB served from cache, "
+                f"{self.bytes_stored / 1024 / 1024:.1f} MB stored.")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachingSession:
+    """Wraps a requests.Session so cacheable responses are served from a ResponseCache.
+
+    Cache hits never reach the wrapped session, so they cost no rate budget.
+    Rate-limit headers are not stored, since replaying them would mislead
+    PRAW's own rate limiter.
+    """
+
+    def __init__(self, cache, session=None):
+        self._cache = cache
+        self._session = session or requests.Session()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        endpoint = classify(method, url)
+        if endpoint is None:
+            return self._session.request(method, url, params=params, data=data, **kwargs)
+
+        key = json.dumps([method, url, sorted((params or {}).items()), sorted(data or [])], default=str)
+        cached = self._cache.get(key)
+        if cached is not None:
+            status, headers, body = cached
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response._content = body
+            response.encoding = "utf-8"
+            response.url = url
+            return response
+
+        response = self._session.request(method, url, params=params, data=data, **kwargs)
+        ttl = self._cache.ttl_for(endpoint, response.content) if response.status_code == 200 else 0
+        if ttl is FOREVER or ttl > 0:
+            headers = {name: value for name, value in response.headers.items() if name.lower() not in UNCACHED_HEADERS and not name.lower().startswith("x-ratelimit")}
+            self._cache.put(key, endpoint, response.status_code, headers, response.content, ttl)
+        return response
+
+
+def parse_ttls(values):
+    """Parses repeated ENDPOINT=SECONDS options ("forever" never expires)."""
+    ttls = {}
+    for value in values or []:
+        endpoint, _, seconds = value.partition("=")
+        if endpoint not in DEFAULT_TTLS or not seconds:
+            raise ValueError(f"Invalid cache TTL '{value}'. Expected ENDPOINT=SECONDS with ENDPOINT one of {', '.join(DEFAULT_TTLS)}.")
+        ttls[endpoint] = FOREVER if seconds == "forever" else float(seconds)
+    return ttls
@@ -0,0 +1,118 @@
+"""
+Durable checkpoints for resumable downloads.
+
+The checkpoint is an append-only log stored next to the output file. The
+first line identifies the run (its parameters and output header); every
+following line records one completed post: its ID, the listing cursor to
+continue from (the post's fullname) and the output offset just after it.
+Posts are recorded in memory and written in batches by commit(), after the
+output they cover has been synced, so each batch costs two fsyncs instead
+of two per post and a crash redoes at most one batch. A torn last line from
+a crash is ignored on load.
+"""
+
+import json
+import os
+
+DEFAULT_CHECKPOINT_INTERVAL = 100 # Posts per commit: one listing page
+
+
+class CheckpointMismatch(Exception):
+    """Raised when --resume is used with parameters that differ from the checkpointed run."""
+
+
+class CheckpointExists(Exception):
+    """Raised when a run without --resume would replace a checkpoint that holds progress."""
+
+
+class Checkpoint:
+    """Progress of a run: listing cursor, completed submission IDs and output offset."""
+
+    def __init__(self, path, run, header):
+        self.path = path
+        self.run = run
+        self.header = header
+        self.after = None
+        self.output_offset = None
+        self.completed = set()
+        self.comment_count = 0
+        self.pending = [] # Recorded entries not yet committed
+        self._file = None
+
+    @classmethod
+    def start(cls, path, run, header):
+        """Creates a fresh checkpoint, replacing any previous one at path."""
+        checkpoint = cls(path, run, header)
+        checkpoint._file = open(path, 'w', encoding='utf-8')
+        checkpoint._append({"run": run, "header": header})
+        return checkpoint
+
+    @staticmethod
+    def has_progress(path):
+        """True if the checkpoint at path has committed posts (or a torn attempt at them)."""
+        with open(path, encoding='utf-8') as f:
+            f.readline()
+            return bool(f.readline().strip())
+
+    @classmethod
+    def resume(cls, path, run):
+        """Loads the checkpoint at path and reopens it for appending.
+
+        Raises CheckpointMismatch if it was written for a different run.
+        """
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().split("\n")
+        first = json.loads(lines[0])
+        if first["run"] != run:
+            raise CheckpointMismatch(f"{path} was written for {first['run']}, not {run}")
+        checkpoint = cls(path, run, first["header"])
+        valid_bytes = len(lines[0].encode('utf-8')) + 1
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break # Torn write from an interrupted run
+            checkpoint._apply(entry)
+            valid_bytes += len(line.encode('utf-8')) + 1
+        checkpoint._file = open(path, 'r+', encoding='utf-8')
+        checkpoint._file.truncate(valid_bytes)
+        checkpoint._file.seek(valid_bytes)
+        return checkpoint
+
+    def _apply(self, entry):
+        self.completed.add(entry["id"])
+        self.after = entry["after"]
+        self.output_offset = entry["offset"]
+        self.comment_count += entry["comments"]
+
+    def _append(self, *entries):
+        self._file.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, submission, output_offset, num_comments):
+        """Records a post whose output ends at output_offset; it is saved by the next commit()."""
+        entry = {"id": submission.id, "after": submission.fullname, "offset": output_offset, "comments": num_comments}
+        self.pending.append(entry)
+        self._apply(entry)
+
+    def commit(self):
+        """Saves the recorded posts; call it only once their output is synced to disk."""
+        if self.pending:
+            self._append(*self.pending)
+            self.pending = []
+
+    @property
+    def post_count(self):
+        return len(self.completed)
+
+    def close(self):
+        """Closes the file; posts recorded since the last commit() are not saved."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Deletes the checkpoint once the run has finished successfully."""
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,855 @@
+#!/usr/bin/env python3
+"""
+Download engine shared by the subreddit and user downloaders.
+
+The engine authenticates once and shares one rate budget, response cache and
+comment-fetch pool between every target it runs, so several subreddits,
+users and date windows can be fetched in one process without each paying
+the startup cost or competing blindly for the same rate limit.
+reddit_downloader.py, reddit_subreddit_downloader.py and
+reddit_subreddit_downloader_daterange.py are thin wrappers around it.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import praw
+
+from reddit_accounts import ClientPool, load_accounts
+from reddit_archive import ArchiveWriter
+from reddit_async import ASYNC_SUPPORTED, AsyncCommentFetchPool, AsyncCommentHydrator, create_async_reddit, expand_comments
+from reddit_cache import DEFAULT_MAX_MB, DEFAULT_TTLS, CachingSession, ResponseCache, parse_ttls
+from reddit_checkpoint import DEFAULT_CHECKPOINT_INTERVAL, Checkpoint, CheckpointExists, CheckpointMismatch
+from reddit_hydrate import DEFAULT_HYDRATE_WORKERS, CommentHydrator
+from reddit_listing import LISTING_CAP, near_listing_cap, new_posts, search_posts, user_posts
+from reddit_metrics import PROGRESS_INTERVAL, InstrumentedSession, Metrics
+from reddit_output import FORMATS, PARQUET_SUPPORTED, TeeWriter, comments_file, default_extension, open_writer, read_posts
+from reddit_replay import Cassette, RecordingSession
+from reddit_slices import find_listing_start, split_window, walk_slice
+from reddit_snapshots import SnapshotWriter
+from reddit_workers import DEFAULT_REQUESTS_PER_MINUTE, BudgetedSession, CommentFetchPool, RateBudget, SHARED_BUDGET_SUPPORTED, OrderedMapPool, SharedRateBudget
+
+# --- Configuration (Replace with your credentials or use environment variables/praw.ini) ---
+# WARNING: Hardcoding credentials is a security risk. The environment
+# variables below take precedence over the values written here.
+# See: https://praw.readthedocs.io/en/stable/getting_started/configuration.html
+CLIENT_ID = os.environ.get("REDDIT_CLIENT_ID", "boS5Qjj6PoMuhozlNCWJRg")
+CLIENT_SECRET = os.environ.get("REDDIT_CLIENT_SECRET", "SIB1AQw8zDd7RYWGuHna7g0JQDieow")
+USERNAME = os.environ.get("REDDIT_USERNAME", "scrypts94")
+PASSWORD = os.environ.get("REDDIT_PASSWORD", "90076650171")
+USER_AGENT = os.environ.get("REDDIT_USER_AGENT", "Python:SelfhostedDownloader:v1.1 (by /u/scrypts94)")
+# API endpoints; only changed to run against a local replay server (see reddit_replay.py)
+OAUTH_URL = os.environ.get("REDDIT_OAUTH_URL", "https://oauth.reddit.com")
+REDDIT_URL = os.environ.get("REDDIT_URL", "https://www.reddit.com")
+# --- End Configuration ---
+
+DEFAULT_SUBREDDIT = "selfhosted"
+DEFAULT_TIME_PERIOD_DAYS = 30
+USER_STRATEGIES = ("search", "walk")
+SEARCH_RESULT_CAP = 250 # Reddit search stops returning results around here
+POST_FIELDS = ("id", "title", "author", "url", "permalink", "created_utc", "score", "upvote_ratio", "selftext", "num_comments")
+
+def format_utc(timestamp, fmt='%Y-%m-%d'):
+    """Formats a UTC timestamp, as a date by default."""
+    return datetime.utcfromtimestamp(timestamp).strftime(fmt)
+
+def comment_info(comment, parent_id=False):
+    """The output record of a comment; with ``parent_id`` also its parent's fullname, which only the archive keeps."""
+    info = {
+        "id": comment.id,
+        "author": str(comment.author), # Handle potential None author
+        "body": comment.body,
+        "score": comment.score,
+        "created_utc": comment.created_utc,
+        "permalink": f"https://www.reddit.com{comment.permalink}"
+    }
+    if parent_id:
+        info["parent_id"] = comment.parent_id
+    return info
+
+def fetch_comments(submission, hydrator=None, parent_id=False):
+    """Expands and flattens the comment tree of a submission.
+
+    With a CommentHydrator the MoreComments objects are resolved in batches;
+    the result is the same as with replace_more().
+    """
+    if hydrator is not None:
+        return [comment_info(comment, parent_id) for comment in hydrator.comments(submission)]
+    submission.comments.replace_more(limit=None) # Expand all MoreComments objects
+    return [comment_info(comment, parent_id) for comment in submission.comments.list()]
+
+def sync_status(submission, previous_posts):
+    """Compares a listed submission with the previous run: "new", "unchanged" or "changed".
+
+    Only the comment count decides whether the thread is refetched; score and
+    the other post fields always come fresh from the listing. A stored post
+    without comments is refetched if the listing reports any, since its
+    comments may have failed to download last time.
+    """
+    previous = previous_posts.get(submission.id)
+    if previous is None:
+        return "new"
+    if previous.get("num_comments") == submission.num_comments and (previous.get("comments") or not submission.num_comments):
+        return "unchanged"
+    return "changed"
+
+
+class SubredditTarget:
+    """Posts of a subreddit created in the last ``days`` days or between two timestamps.
+
+    With ``slices``, a date range is split into that many time slices that
+    are listed independently (see reddit_slices.py) instead of paging back
+    from the newest post.
+    """
+
+    include_comments = False # Only user targets collect comments outside their posts
+    supports_incremental = True # Post records keep num_comments, which incremental sync compares
+
+    def __init__(self, subreddit, days=None, start_timestamp=None, end_timestamp=None, output_file=None, previous_file=None, slices=None):
+        self.subreddit = subreddit
+        self.days = days
+        self.start_timestamp = start_timestamp
+        self.end_timestamp = end_timestamp
+        self.output_file = output_file
+        self.previous_file = previous_file
+        self.slices = slices
+
+    def default_output_file(self, output_format):
+        extension = default_extension(output_format)
+        if self.days is not None:
+            return f"{self.subreddit}_last_{self.days}_days_data.{extension}"
+        return f"{self.subreddit}_{format_utc(self.start_timestamp)}_to_{format_utc(self.end_timestamp)}_data.{extension}"
+
+    def header(self):
+        """Output header; for a last-N-days target this also fixes the cutoff time."""
+        if self.days is not None:
+            self._cutoff_time = time.time() - (self.days * 24 * 60 * 60)
+            return {
+                "subreddit": self.subreddit,
+                "time_period_days": self.days,
+                "download_time": datetime.utcnow().isoformat() + "Z"
+            }
+        return {
+            "subreddit": self.subreddit,
+            "start_date": format_utc(self.start_timestamp),
+            "end_date": format_utc(self.end_timestamp),
+            "start_timestamp_utc": self.start_timestamp,
+            "end_timestamp_utc": self.end_timestamp,
+            "download_time": datetime.utcnow().isoformat() + "Z"
+        }
+
+    def describe(self):
+        if self.days is not None:
+            return f"posts from r/{self.subreddit} created in the last {self.days} days"
+        return f"posts from r/{self.subreddit} created between {format_utc(self.start_timestamp)} and {format_utc(self.end_timestamp)}"
+
+    def run_key(self):
+        """Identifies a resumable run; only fixed date ranges can be resumed."""
+        if self.days is not None:
+            return None
+        return {"subreddit": self.subreddit, "start_timestamp_utc": self.start_timestamp, "end_timestamp_utc": self.end_timestamp}
+
+    def window(self):
+        """(start, end) of the time the listing walks back through, for progress estimates."""
+        if self.days is not None:
+            return self._cutoff_time, self._cutoff_time + self.days * 24 * 60 * 60
+        return self.start_timestamp, min(self.end_timestamp, time.time())
+
+    def submissions(self, reddit, after=None, completed=(), create_reddit=None, pool=None, raw=False):
+        """Yields submissions from subreddit.new() created within the window.
+
+        When resuming, the listing starts after the ``after`` fullname and any
+        submission already in ``completed`` is skipped. With ``raw`` the
+        submissions are ListedPosts read from the listing JSON (see reddit_listing.py).
+        """
+        if self.slices and self.days is None:
+            yield from self._sliced_submissions(reddit, completed, create_reddit or (lambda: reddit), pool or OrderedMapPool(), raw)
+            return
+        if self.days is not None:
+            start_timestamp, end_timestamp = self._cutoff_time, None
+            too_old = f"{self.days} days"
+        else:
+            start_timestamp, end_timestamp = self.start_timestamp, self.end_timestamp
+            too_old = format_utc(start_timestamp)
+        params = {"after": after} if after else None
+        listed = len(completed) if after else 0 # A resumed listing starts past the posts already written
+        # We fetch in reverse chronological order and stop when posts are too old
+        for submission in new_posts(reddit, self.subreddit, params, raw=raw):
+            listed += 1
+            if submission.created_utc < start_timestamp:
+                print(f"Reached posts older than {too_old}. Stopping search.")
+                break
+
+            # Skip if the post is newer than the end date (shouldn't happen with .new() but good practice)
+            if end_timestamp is not None and submission.created_utc > end_timestamp:
+                continue
+
+            # Skip posts a resumed run has already written
+            if submission.id in completed:
+                continue
+
+            yield submission
+        else:
+            if near_listing_cap(listed):
+                print(f"Warning: Reddit's listing ended after {listed} posts, before reaching posts older than {too_old} (it serves about {LISTING_CAP}); older posts in the window may be missing.", file=sys.stderr)
+
+    def _sliced_submissions(self, reddit, completed, create_reddit, pool, raw=False):
+        """Lists every slice of the date range on ``pool`` (an OrderedMapPool) and yields them newest first.
+
+        Each slice's starting post is probed first. Neighbouring slices that
+        start at the same post (or, when no post of the subreddit could be
+        found past their end, at the newest post) are listed as one, so they
+        do not page through the same posts twice.
+        A resumed run relists the slices and skips ``completed`` posts, since
+        a single ``after`` cursor does not describe progress across slices.
+        Slices whose listing was cut off before their start are reported at the end.
+        """
+        newest = next(iter(new_posts(reddit, self.subreddit, limit=1, raw=raw)), None)
+        if newest is None:
+            return
+        windows = split_window(self.start_timestamp, self.end_timestamp, self.slices)
+
+        def slice_start(window):
+            if newest.created_utc <= window[1]:
+                return None
+            slice_reddit = create_reddit() # The pool thread's own instance; PRAW instances are not thread-safe
+            return find_listing_start(slice_reddit, self.subreddit, window[1], 0, int(newest.id, 36))
+
+        slices = [] # (window, after) of each listing, newest first
+        for window, after in zip(windows, pool.map(slice_start, windows)):
+            if slices and slices[-1][1] == after:
+                slices[-1] = ((window[0], slices[-1][0][1]), after)
+            else:
+                slices.append((window, after))
+        if len(slices) < len(windows):
+            print(f"Splitting the date range into {len(windows)} slices, listed as {len(slices)} (slices starting at the same post are listed together).")
+        else:
+            print(f"Splitting the date range into {len(windows)} slices.")
+
+        def list_slice(listing_slice):
+            (start_timestamp, end_timestamp), after = listing_slice
+            return walk_slice(create_reddit(), self.subreddit, start_timestamp, end_timestamp, after, raw)
+
+        uncovered = []
+        seen = set() # Posts on a slice boundary are listed by both slices
+        for (window, _), (submissions, covered) in zip(slices, pool.map(list_slice, slices)):
+            if not covered:
+                uncovered.append((window, submissions[-1].created_utc if submissions else None))
+            for submission in submissions:
+                if submission.id not in seen and submission.id not in completed:
+                    seen.add(submission.id)
+                    yield submission
+
+        if uncovered:
+            print(f"Warning: {len(uncovered)} of {len(slices)} slices could not be fully covered; Reddit's listing may have been cut off at its {LISTING_CAP} post cap (counted from the newest post) before their start:", file=sys.stderr)
+            for (start_timestamp, end_timestamp), oldest in uncovered:
+                reached = f"reached {format_utc(oldest, '%Y-%m-%d %H:%M')}" if oldest is not None else "returned no posts"
+                print(f"  {format_utc(start_timestamp, '%Y-%m-%d %H:%M')} to {format_utc(end_timestamp, '%Y-%m-%d %H:%M')}: listing {reached}", file=sys.stderr)
+        else:
+            print(f"All {len(slices)} slices were fully covered.")
+
+    def post_info(self, submission):
+        return {
+            "id": submission.id,
+            "title": submission.title,
+            "author": str(submission.author),
+            "url": submission.url,
+            "permalink": f"https://www.reddit.com{submission.permalink}",
+            "created_utc": submission.created_utc,
+            "score": submission.score,
+            "upvote_ratio": submission.upvote_ratio,
+            "selftext": submission.selftext,
+            "num_comments": submission.num_comments,
+            "comments": []
+        }
+
+
+class UserTarget:
+    """Posts (and optionally comments) a user made in one subreddit.
+
+    The default "search" strategy asks Reddit's subreddit-scoped search for
+    the user's posts, so only that subreddit's listing pages are fetched.
+    Search returns at most SEARCH_RESULT_CAP results and can fail, so in those
+    cases the walk over the user's whole submission history takes over where
+    search stopped. The "walk" strategy always does the full walk.
+
+    Fewer than SEARCH_RESULT_CAP results are taken as all of the user's posts
+    without a walk to confirm it, so posts missing from Reddit's search index
+    (very new or removed from search) are missing from the output too; the
+    walk strategy does not have that gap.
+    """
+
+    supports_incremental = False # Post records have no num_comments to compare
+
+    def __init__(self, username, subreddit=DEFAULT_SUBREDDIT, output_file=None, previous_file=None,
+                 since=None, strategy="search", include_comments=False):
+        self.username = username
+        self.subreddit = subreddit
+        self.output_file = output_file
+        self.previous_file = previous_file
+        self.since = since
+        self.strategy = strategy
+        self.include_comments = include_comments
+
+    def default_output_file(self, output_format):
+        return f"{self.username}_{self.subreddit}_data.{default_extension(output_format)}"
+
+    def header(self):
+        header = {
+            "username": self.username,
+            "subreddit": self.subreddit,
+            "download_time": datetime.utcnow().isoformat() + "Z"
+        }
+        if self.since is not None:
+            header["since_timestamp_utc"] = self.since
+        return header
+
+    def describe(self):
+        since = f" since {format_utc(self.since)}" if self.since is not None else ""
+        return f"data for user: u/{self.username} in r/{self.subreddit}{since}"
+
+    def run_key(self):
+        return None
+
+    def window(self):
+        """(start, end) of the time the listing walks back through; unknown without ``since``."""
+        return (self.since, time.time()) if self.since is not None else None
+
+    def _in_subreddit(self, thing):
+        return str(thing.subreddit).lower() == self.subreddit.lower() # The display name, without fetching the subreddit
+
+    def _walk(self, reddit, after=None, raw=False):
+        """Walks the user's whole submission history, newest first."""
+        params = {"after": after} if after else None
+        for submission in user_posts(reddit, self.username, params, raw): # Fetch all submissions
+            if self.since is not None and submission.created_utc < self.since:
+                break
+            if self._in_subreddit(submission):
+                yield submission
+
+    def submissions(self, reddit, after=None, completed=(), create_reddit=None, pool=None, raw=False):
+        """Yields the user's submissions that were posted in the target subreddit, newest first."""
+        if self.strategy == "walk":
+            yield from self._walk(reddit, raw=raw)
+            return
+
+        results = search_posts(reddit, self.subreddit, f'author:"{self.username}"', raw)
+        count = 0
+        oldest = None # Fullname of the oldest post yielded so far
+        try:
+            for submission in results:
+                count += 1
+                if self.since is not None and submission.created_utc < self.since:
+                    return
+                # Search matches loosely, so keep only this user's posts in this subreddit
+                if str(submission.author).lower() == self.username.lower() and self._in_subreddit(submission):
+                    oldest = submission.fullname
+                    yield submission
+        except Exception as e:
+            print(f"Subreddit search failed ({e}). Walking the user's submission history instead.", file=sys.stderr)
+        else:
+            if count < SEARCH_RESULT_CAP:
+                return
+            print(f"Search returned its maximum of {SEARCH_RESULT_CAP} results. Walking the rest of the user's submission history.")
+        yield from self._walk(reddit, oldest, raw)
+
+    def post_info(self, submission):
+        return {
+            "id": submission.id,
+            "title": submission.title,
+            "url": submission.url,
+            "permalink": f"https://www.reddit.com{submission.permalink}",
+            "created_utc": submission.created_utc,
+            "score": submission.score,
+            "upvote_ratio": submission.upvote_ratio,
+            "selftext": submission.selftext,
+            "comments": []
+        }
+
+    def user_comments(self, reddit, parent_id=False):
+        """Yields the user's own comments anywhere in the subreddit.
+
+        Reddit has no subreddit-scoped comment search, so this walks the
+        user's comment history (stopping early at ``since``).
+        """
+        for comment in reddit.redditor(self.username).comments.new(limit=None):
+            if self.since is not None and comment.created_utc < self.since:
+                break
+            if self._in_subreddit(comment):
+                yield dict(comment_info(comment, parent_id), link_id=comment.link_id)
+
+
+class Engine:
+    """Authenticates once and fetches any number of targets through one shared pipeline."""
+
+    def __init__(self, user_agent=USER_AGENT, workers=1, requests_per_minute=None,
+                 output_format="json", archive_file=None, cache=None, incremental=False, resume=False,
+                 rate_limit_file=None, recorder=None, hydrate_workers=DEFAULT_HYDRATE_WORKERS, posts_only=False, fields=None,
+                 quiet=False, metrics_port=None, metrics_report=None, accounts=None, use_async=False, snapshot_file=None,
+                 checkpoint=True, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, restart=False):
+        self.user_agent = user_agent
+        self.output_format = output_format
+        self.archive_file = archive_file
+        self.snapshot_file = snapshot_file
+        self.cache = cache
+        self.incremental = incremental
+        self.resume = resume
+        self.restart = restart # Discard the checkpoint of an interrupted run instead of refusing to start
+        self.checkpoint = checkpoint # Checkpoint resumable targets so --resume can continue them
+        self.checkpoint_interval = checkpoint_interval # Posts between checkpoint commits
+        self.workers = workers
+        self.listing_pool = OrderedMapPool(workers) # Lists time slices; its threads keep their PRAW instances
+        self.recorder = recorder
+        # Posts-only runs build records from the listing JSON alone; fields implies it
+        self.posts_only = posts_only or fields is not None
+        self.fields = fields
+        self.quiet = quiet # One progress line every PROGRESS_INTERVAL seconds instead of lines per post
+        self.metrics_report = metrics_report
+        self.first_record_at = None # time.monotonic() when the first post was written
+        # Without an account pool, the credentials configured above are the only account
+        self.accounts = accounts or [{"name": USERNAME, "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET,
+                                      "username": USERNAME, "password": PASSWORD}]
+        # Each account's budget starts at requests_per_minute (if given) and then
+        # follows Reddit's rate-limit headers, never going above requests_per_minute
+        initial_rate = requests_per_minute or DEFAULT_REQUESTS_PER_MINUTE
+        self.budgets = []
+        for account in self.accounts:
+            if rate_limit_file:
+                path = rate_limit_file if len(self.accounts) == 1 else f"{rate_limit_file}.{account['client_id']}"
+                self.budgets.append(SharedRateBudget(path, initial_rate, max_requests_per_minute=requests_per_minute))
+            else:
+                self.budgets.append(RateBudget(initial_rate, max_requests_per_minute=requests_per_minute))
+        self.clients = ClientPool(self.budgets, self.create_reddit)
+        self.metrics = Metrics(self.budgets, [account["name"] for account in self.accounts])
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = self.metrics.serve(metrics_port)
+            print(f"Serving metrics at http://127.0.0.1:{self.metrics_server.server_address[1]}/metrics")
+        self.reddit = self.authenticate()
+        if use_async:
+            # Comment trees are fetched with Async PRAW on an event loop; the listing stays on PRAW
+            self.hydrator = None
+            self.async_clients = ClientPool(self.budgets, self.create_async_reddit)
+            self.async_hydrator = AsyncCommentHydrator(self.async_clients.reddit, hydrate_workers) if hydrate_workers > 0 else None
+            self.pool = AsyncCommentFetchPool(self.async_clients, self._fetch_comments_async, workers)
+        else:
+            self.hydrator = CommentHydrator(self.clients.reddit, hydrate_workers) if hydrate_workers > 0 else None
+            self.pool = CommentFetchPool(self.clients.reddit, self._fetch_comments, workers, rebind=len(self.accounts) > 1)
+
+    def create_reddit(self, index=0):
+        """Creates a Reddit instance of account ``index`` whose requests draw from that account's rate budget.
+
+        With a response cache, cached responses are served without using the budget.
+        With a recorder, every exchange that reaches Reddit is written to its cassette.
+        Every request that reaches Reddit is timed for the run metrics.
+        """
+        session = InstrumentedSession(self.metrics, RecordingSession(self.recorder) if self.recorder else None)
+        session = BudgetedSession(self.budgets[index], session)
+        if self.cache is not None:
+            session = CachingSession(self.cache, session)
+        account = self.accounts[index]
+        return praw.Reddit(
+            client_id=account["client_id"],
+            client_secret=account["client_secret"],
+            password=account["password"],
+            user_agent=account.get("user_agent") or self.user_agent,
+            username=account["username"],
+            oauth_url=OAUTH_URL,
+            reddit_url=REDDIT_URL,
+            requestor_kwargs={"session": session},
+        )
+
+    def create_async_reddit(self, index=0):
+        """Creates an Async PRAW instance of account ``index`` drawing from that account's rate budget (--async)."""
+        return create_async_reddit(self.accounts[index], self.user_agent, self.budgets[index], self.metrics,
+                                   oauth_url=OAUTH_URL, reddit_url=REDDIT_URL)
+
+    def authenticate(self):
+        """Authenticates every account with Reddit using PRAW; returns the first account's instance."""
+        print("Authenticating with Reddit...")
+        try:
+            for index, account in enumerate(self.accounts):
+                # Verify authentication
+                if len(self.accounts) == 1:
+                    print(f"Authenticated as: {self.clients.client(index).user.me()}")
+                else:
+                    print(f"Account {account['name']}: authenticated as {self.clients.client(index).user.me()}")
+            return self.clients.client(0)
+        except Exception as e:
+            print(f"Error during authentication: {e}", file=sys.stderr)
+            print("Please ensure your credentials (CLIENT_ID, CLIENT_SECRET, USERNAME, PASSWORD, USER_AGENT) are correct.", file=sys.stderr)
+            print("You might need to register a 'script' application on Reddit: https://www.reddit.com/prefs/apps", file=sys.stderr)
+            sys.exit(1)
+
+    def _fetch_comments(self, submission):
+        start = time.monotonic()
+        comments = fetch_comments(submission, self.hydrator, self.archive_file is not None)
+        self.metrics.thread(submission.id, time.monotonic() - start, len(comments))
+        return comments
+
+    async def _fetch_comments_async(self, submission):
+        start = time.monotonic()
+        comments = [comment_info(comment, self.archive_file is not None) for comment in await expand_comments(submission, self.async_hydrator)]
+        self.metrics.thread(submission.id, time.monotonic() - start, len(comments))
+        return comments
+
+    def run(self, targets):
+        """Fetches every target in turn; returns the number of targets that failed."""
+        failures = 0
+        for target in targets:
+            if not self.fetch(target):
+                failures += 1
+        return failures
+
+    def _load_previous_posts(self, target, output_file):
+        previous_file = target.previous_file or output_file
+        if not os.path.exists(previous_file):
+            print(f"No previous output found at {previous_file}. Downloading everything.")
+            return {}
+        previous_posts = {post["id"]: post for post in read_posts(previous_file)}
+        print(f"Loaded {len(previous_posts)} posts from {previous_file} for incremental sync.")
+        return previous_posts
+
+    def _open_checkpoint(self, target, output_file, header):
+        """Starts or resumes the checkpoint of a resumable target (None otherwise, or with checkpointing off)."""
+        run = target.run_key()
+        if run is None or not self.checkpoint:
+            return None
+        run = dict(run, format=self.output_format)
+        if self.posts_only:
+            run["fields"] = list(self.fields or POST_FIELDS)
+        checkpoint_file = output_file + ".checkpoint"
+        if self.resume and os.path.exists(checkpoint_file):
+            checkpoint = Checkpoint.resume(checkpoint_file, run)
+            print(f"Resuming after {checkpoint.post_count} completed posts (listing cursor: {checkpoint.after})...")
+            return checkpoint
+        if self.resume:
+            print(f"No checkpoint found at {checkpoint_file}. Starting from the beginning.")
+        elif os.path.exists(checkpoint_file) and Checkpoint.has_progress(checkpoint_file):
+            if not self.restart:
+                raise CheckpointExists(f"{checkpoint_file} holds the progress of an interrupted run. Run again with --resume to continue it, or with --restart to discard it and start over.")
+            print(f"Discarding the checkpoint at {checkpoint_file} and starting over.")
+        return Checkpoint.start(checkpoint_file, run, header)
+
+    def _header(self, target):
+        header = target.header()
+        if self.posts_only:
+            header["posts_only"] = True
+        if self.fields:
+            header["fields"] = list(self.fields)
+        return header
+
+    def _record(self, target, submission):
+        """The output record of a post; posts-only records have no comments and only the chosen fields."""
+        post_info = target.post_info(submission)
+        if not self.posts_only:
+            return post_info
+        del post_info["comments"]
+        if self.fields:
+            post_info = {name: post_info[name] for name in self.fields if name in post_info}
+        return post_info
+
+    def fetch(self, target):
+        """Fetches one target's posts and comments and writes its output file.
+
+        Returns False if the run failed; completed posts are kept by streamed
+        formats and resumable targets leave a checkpoint behind.
+        """
+        output_file = target.output_file or target.default_output_file(self.output_format)
+        print(f"Fetching {target.describe()}...")
+        header = self._header(target)
+        previous_posts = self._load_previous_posts(target, output_file) if self.incremental and target.supports_incremental else None
+
+        sync_counts = {"new": 0, "unchanged": 0, "changed": 0}
+        output_files = [output_file, output_file + ".partial"]
+        if self.output_format == "parquet":
+            output_files.append(comments_file(output_file))
+        self.metrics.start_target(target.describe(), target.window(), output_files)
+        last_progress = time.monotonic()
+
+        def stored_comments(submission):
+            if previous_posts is not None and sync_status(submission, previous_posts) == "unchanged":
+                return previous_posts[submission.id].get("comments", [])
+            return None
+
+        checkpoint = writer = None
+        try:
+            # Resumable targets are checkpointed every checkpoint_interval posts. JSON and Parquet
+            # output is spooled to a .partial NDJSON file until the end so it can resume too.
+            checkpoint = self._open_checkpoint(target, output_file, header)
+            if checkpoint is not None:
+                header = checkpoint.header
+                spool_file = output_file + ".partial" if self.output_format in ("json", "parquet") else None
+                writer = open_writer(self.output_format, output_file, header, spool_file, checkpoint.output_offset)
+                post_count, comment_count = checkpoint.post_count, checkpoint.comment_count
+                after, completed = checkpoint.after, checkpoint.completed
+            else:
+                writer = open_writer(self.output_format, output_file, header)
+                post_count, comment_count = 0, 0
+                after, completed = None, ()
+            sinks = []
+            if self.archive_file:
+                sinks.append(ArchiveWriter(self.archive_file, header))
+            if self.snapshot_file:
+                sinks.append(SnapshotWriter(self.snapshot_file, header))
+            if sinks:
+                writer = TeeWriter(writer, *sinks)
+
+            submissions = target.submissions(self.reddit, after, completed, self.clients.reddit, self.listing_pool, raw=self.posts_only)
+            if self.posts_only:
+                posts = ((submission, None) for submission in submissions)
+            else:
+                # Comment trees are fetched by the pool while the listing is walked;
+                # results still come back in listing order.
+                posts = self.pool.imap(submissions, stored_comments)
+            for submission, get_comments in posts:
+                post_count += 1
+                if not self.quiet:
+                    print(f"  Processing post {post_count}: {submission.id} (Created: {format_utc(submission.created_utc, '%Y-%m-%d %H:%M:%S')}) - \"{submission.title[:50]}...\"")
+                post_info = self._record(target, submission)
+
+                if get_comments is not None:
+                    # Fetch comments for the submission (or reuse them if the thread is unchanged)
+                    status = sync_status(submission, previous_posts) if previous_posts is not None else "new"
+                    try:
+                        post_info["comments"] = get_comments()
+                        comment_count += len(post_info["comments"])
+                        if not self.quiet:
+                            if status == "unchanged":
+                                print(f"    Unchanged since last run, reused {len(post_info['comments'])} comments.")
+                            else:
+                                print(f"    Found {len(post_info['comments'])} comments.")
+                    except Exception as comment_e:
+                        print(f"    Error fetching comments for post {submission.id}: {comment_e}", file=sys.stderr)
+                        # Continue to next post even if comments fail for one
+                    sync_counts[status] += 1
+
+                write_start = time.monotonic()
+                writer.write_post(post_info)
+                if self.first_record_at is None:
+                    self.first_record_at = time.monotonic()
+                if checkpoint is not None:
+                    checkpoint.record(submission, writer.offset(), len(post_info.get("comments", ())))
+                    if len(checkpoint.pending) >= self.checkpoint_interval:
+                        writer.sync() # The output first, so a commit never covers unsynced posts
+                        checkpoint.commit()
+                comments = len(post_info["comments"]) if "comments" in post_info else None
+                self.metrics.post_written(submission.created_utc, comments, time.monotonic() - write_start)
+                if self.quiet and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    print(self.metrics.progress_line())
+                    last_progress = time.monotonic()
+
+            if target.include_comments and not self.posts_only:
+                user_comments = list(target.user_comments(self.reddit, self.archive_file is not None))
+                print(f"Found {len(user_comments)} comments by the user anywhere in the subreddit.")
+                writer.write_user_comments(user_comments)
+
+            if self.posts_only:
+                print(f"\nFinished fetching. Found {post_count} posts in total (comments were skipped).")
+            else:
+                print(f"\nFinished fetching. Found {post_count} posts and {comment_count} comments in total.")
+            if previous_posts is not None:
+                print(f"Incremental sync: {sync_counts['unchanged']} threads skipped, {sync_counts['changed']} refreshed, {sync_counts['new']} newly added.")
+
+            # Save data to the output file (streamed formats are already on disk)
+            print(f"Saving data to {output_file}...")
+            writer.close()
+            if checkpoint is not None:
+                checkpoint.remove()
+            self.metrics.finish_target(succeeded=True)
+            print("Data saved successfully.")
+            return True
+
+        except CheckpointMismatch as e:
+            print(f"Error: cannot resume: {e}", file=sys.stderr)
+            self.metrics.finish_target(succeeded=False)
+            return False
+        except CheckpointExists as e:
+            print(f"Error: {e}", file=sys.stderr)
+            self.metrics.finish_target(succeeded=False)
+            return False
+        except Exception as e:
+            print(f"An error occurred while fetching data: {e}", file=sys.stderr)
+            if checkpoint is not None and writer is not None:
+                try:
+                    # Keep the progress made since the last commit
+                    writer.sync()
+                    checkpoint.commit()
+                except OSError as sync_e:
+                    print(f"Could not save the latest progress: {sync_e}", file=sys.stderr)
+            if writer is not None:
+                writer.abort()
+            if checkpoint is not None:
+                checkpoint.close()
+                print(f"Progress was saved to {checkpoint.path}. Run again with --resume to continue.", file=sys.stderr)
+            elif self.output_format in ("ndjson", "parquet"):
+                print(f"Posts completed so far were kept in {output_file}", file=sys.stderr)
+            self.metrics.finish_target(succeeded=False)
+            return False
+
+    def close(self):
+        self.pool.close()
+        self.listing_pool.close()
+        if self.hydrator is not None:
+            self.hydrator.close()
+        for account, budget in zip(self.accounts, self.budgets):
+            print(budget.summary() if len(self.accounts) == 1 else f"Account {account['name']}: {budget.summary()}")
+        if self.metrics_report:
+            with open(self.metrics_report, 'w', encoding='utf-8') as f:
+                json.dump(self.metrics.report(), f, indent=4)
+            print(f"Run report saved to {self.metrics_report}")
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        for budget in self.budgets:
+            if isinstance(budget, SharedRateBudget):
+                budget.close()
+        if self.cache is not None:
+            print(self.cache.summary())
+            self.cache.close()
+        if self.recorder is not None:
+            print(f"Recorded {self.recorder.exchanges} API exchanges to {self.recorder.path}")
+            self.recorder.close()
+
+
+def add_engine_arguments(parser):
+    """Adds the output, archive, cache and concurrency options shared by every downloader."""
+    parser.add_argument("--format", choices=FORMATS, default="json", help="Output format: one indented JSON document written at the end (json, default), one post per line written as each post completes (ndjson), or Parquet tables of posts and comments (parquet, needs pyarrow; checkpointed runs spool to NDJSON and convert at the end, use --no-checkpoint to write row groups as posts complete).")
+    parser.add_argument("--archive", default=None, metavar="PATH", help="Also upsert posts and comments into this SQLite archive (see reddit_archive.py).")
+    parser.add_argument("--snapshots", default=None, metavar="PATH", help="Also add this run to a deduplicated SQLite snapshot store that only keeps records that changed since the previous run (see reddit_snapshots.py).")
+    parser.add_argument("--cache", default=None, metavar="PATH", help="Cache API responses in this SQLite file so repeated runs over the same posts are served from disk.")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_MB, metavar="MB", help=f"Maximum response cache size; least recently used entries are evicted beyond it. Defaults to {DEFAULT_MAX_MB} MB.")
+    parser.add_argument("--cache-ttl", action="append", default=[], metavar="ENDPOINT=SECONDS", help=f"Override how long cached responses stay valid, per endpoint ({', '.join(DEFAULT_TTLS)}). Use 'forever' to never expire. Can be repeated.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of submissions whose comment trees are fetched concurrently. Defaults to 1 (sequential).")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Fetch comment trees on an asyncio event loop with Async PRAW (pip install asyncpraw) instead of worker threads, so --workers can be in the hundreds.")
+    parser.add_argument("--hydrate-workers", type=int, default=DEFAULT_HYDRATE_WORKERS, help=f"Concurrent batched 'load more comments' requests (100 comment IDs each). 0 expands them one at a time with replace_more(). Defaults to {DEFAULT_HYDRATE_WORKERS}.")
+    parser.add_argument("--rate-limit", type=int, default=None, help=f"Maximum requests per minute shared by all workers. By default requests are paced from Reddit's rate-limit headers, starting at {DEFAULT_REQUESTS_PER_MINUTE}.")
+    parser.add_argument("--record", default=None, metavar="PATH", help="Record every API exchange to this compressed cassette for reddit_replay.py and reddit_benchmark.py.")
+    parser.add_argument("--accounts", default=None, metavar="PATH", help="Spread the work over several script apps listed in this INI file (one section per account with client_id, client_secret, username, password). Numbered REDDIT_CLIENT_ID_1, REDDIT_CLIENT_SECRET_1, ... variables are used when it is not given.")
+    parser.add_argument("--rate-limit-file", default=None, metavar="PATH", help="Share the rate budget with every other process using the same file (and client ID) through a file lock. Unix-like systems only.")
+    parser.add_argument("-q", "--quiet", action="store_true", help=f"Print a progress line (with an ETA for date ranges) every {PROGRESS_INTERVAL} seconds instead of a line per post.")
+    parser.add_argument("--metrics-port", type=int, default=None, metavar="PORT", help="Serve live metrics in Prometheus' text format at http://127.0.0.1:PORT/metrics.")
+    parser.add_argument("--metrics-report", default=None, metavar="PATH", help="Save a JSON run report (request latency per endpoint, slowest threads, time per phase) at the end.")
+    parser.add_argument("--posts-only", action="store_true", help="Skip comments and build post records straight from the listing pages: one request per 100 posts.")
+    parser.add_argument("--fields", type=parse_fields, default=None, metavar="FIELD,...", help=f"Only keep these post fields (implies --posts-only; id is always kept). Choose from: {', '.join(POST_FIELDS)}.")
+
+def add_checkpoint_arguments(parser):
+    """Adds the options that control the checkpoints of date-range targets."""
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_INTERVAL, metavar="N", help=f"Save the checkpoint every N posts (two fsyncs each); a resumed run redoes at most N posts. Defaults to {DEFAULT_CHECKPOINT_INTERVAL}.")
+    parser.add_argument("--no-checkpoint", dest="checkpoint", action="store_false", help="Do not checkpoint date-range targets. They cannot be resumed, but JSON and Parquet output is written directly (Parquet in row groups as posts complete) instead of through a .partial spool file.")
+    parser.add_argument("--restart", action="store_true", help="Discard the checkpoint of an interrupted run and start over. Without it (or --resume), a run whose checkpoint holds progress refuses to start.")
+
+def parse_fields(value):
+    """Parses a comma-separated --fields list into a tuple of post fields, starting with id."""
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown post field(s): {', '.join(unknown)}. Choose from: {', '.join(POST_FIELDS)}.")
+    return ("id",) + tuple(dict.fromkeys(name for name in fields if name != "id"))
+
+def create_engine(parser, args, user_agent=USER_AGENT, **options):
+    """Builds an Engine from the options added by add_engine_arguments."""
+    try:
+        cache_ttls = parse_ttls(args.cache_ttl)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == "parquet" and not PARQUET_SUPPORTED:
+        parser.error("--format parquet needs pyarrow (pip install pyarrow).")
+    if args.rate_limit_file and not SHARED_BUDGET_SUPPORTED:
+        parser.error("--rate-limit-file needs file locking (fcntl), which this platform does not provide.")
+    if options.get("resume") and not options.get("checkpoint", True):
+        parser.error("--resume needs checkpoints; leave out --no-checkpoint.")
+    if options.get("resume") and options.get("restart"):
+        parser.error("Use either --resume or --restart, not both.")
+    if options.get("checkpoint_interval", DEFAULT_CHECKPOINT_INTERVAL) < 1:
+        parser.error("--checkpoint-every must be at least 1.")
+    posts_only = args.posts_only or args.fields is not None
+    if posts_only and options.get("incremental"):
+        parser.error("--incremental reuses comment trees, so it cannot be combined with --posts-only or --fields.")
+    if args.fields is not None and args.archive:
+        parser.error("--archive needs complete post records; use --posts-only instead of --fields.")
+    if args.use_async and not ASYNC_SUPPORTED:
+        parser.error("--async needs Async PRAW (pip install asyncpraw).")
+    if args.use_async and (args.cache or args.record):
+        parser.error("--cache and --record only work with the threaded fetcher; leave out --async.")
+    try:
+        accounts = load_accounts(args.accounts)
+    except ValueError as e:
+        parser.error(str(e))
+    cache = ResponseCache(args.cache, args.cache_size, cache_ttls) if args.cache else None
+    recorder = Cassette(args.record) if args.record else None
+    return Engine(user_agent, args.workers, args.rate_limit, args.format, args.archive, cache,
+                  rate_limit_file=args.rate_limit_file, recorder=recorder, hydrate_workers=args.hydrate_workers,
+                  posts_only=args.posts_only, fields=args.fields, quiet=args.quiet,
+                  metrics_port=args.metrics_port, metrics_report=args.metrics_report, accounts=accounts,
+                  use_async=args.use_async, snapshot_file=args.snapshots, **options)
+
+def valid_date(s):
+    """Convert YYYY-MM-DD string to UTC timestamp at start of day."""
+    try:
+        # Assume input is UTC date, get timestamp for start of that day (00:00:00 UTC)
+        dt = datetime.strptime(s, "%Y-%m-%d")
+        return dt.replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        msg = f"Not a valid date: '{s}'. Expected format: YYYY-MM-DD."
+        raise argparse.ArgumentTypeError(msg)
+
+def main():
+    """Main function to parse arguments and run every requested target."""
+    parser = argparse.ArgumentParser(description="Download posts and comments for several subreddits and users in one run.")
+    parser.add_argument("--subreddit", action="append", default=[], help="Subreddit to download. Can be repeated.")
+    parser.add_argument("--user", action="append", default=[], help="User whose posts to download. Can be repeated.")
+    parser.add_argument("--user-subreddit", default=DEFAULT_SUBREDDIT, help=f"Subreddit the --user targets are restricted to. Defaults to {DEFAULT_SUBREDDIT}.")
+    parser.add_argument("--user-since", type=valid_date, default=None, help="Stop walking each user's history at posts (and comments) older than this YYYY-MM-DD date.")
+    parser.add_argument("--user-strategy", choices=USER_STRATEGIES, default="search", help="How --user posts are found: subreddit-scoped search with a walk fallback (search, default) or a walk over the user's whole history (walk). Search misses posts that are not in Reddit's search index; walk does not.")
+    parser.add_argument("--user-comments", action="store_true", help="Also collect each user's comments on other posts in the subreddit.")
+    parser.add_argument("--days", type=int, default=None, help=f"Download subreddit posts from the last N days. Defaults to {DEFAULT_TIME_PERIOD_DAYS} unless a date range is given.")
+    parser.add_argument("--start-date", type=valid_date, default=None, help="Start date (inclusive) in YYYY-MM-DD format.")
+    parser.add_argument("--end-date", type=valid_date, default=None, help="End date (inclusive) in YYYY-MM-DD format. Posts up to 23:59:59 UTC on this day will be included.")
+    parser.add_argument("--slices", type=int, default=None, help="Split each date-range target into N time slices that are listed independently and, with --workers, concurrently.")
+    parser.add_argument("--output-dir", default=".", help="Directory for the output files, which use each downloader's default file name.")
+    parser.add_argument("--resume", action="store_true", help="Continue interrupted date-range targets from their checkpoints.")
+    add_checkpoint_arguments(parser)
+    parser.add_argument("--incremental", action="store_true", help="Only refetch comment trees whose comment count changed since the previous output file of each subreddit target. Not available with --user.")
+    add_engine_arguments(parser)
+
+    args = parser.parse_args()
+
+    if not args.subreddit and not args.user:
+        parser.error("Give at least one --subreddit or --user.")
+    if (args.start_date is None) != (args.end_date is None):
+        parser.error("--start-date and --end-date must be given together.")
+    if args.start_date is not None and args.days is not None:
+        parser.error("Use either --days or a date range, not both.")
+    if args.start_date is not None and args.start_date > args.end_date:
+        parser.error("Start date cannot be after end date.")
+    if args.slices is not None and args.slices < 1:
+        parser.error("--slices must be at least 1.")
+    if args.incremental and args.user:
+        parser.error("--incremental compares each post's num_comments, which user post records do not store; run --user targets without it.")
+
+    targets = []
+    for subreddit in args.subreddit:
+        if args.start_date is not None:
+            # Add almost a full day to the end timestamp to include the entire end date
+            target = SubredditTarget(subreddit, start_timestamp=args.start_date, end_timestamp=args.end_date + (24 * 60 * 60 - 1), slices=args.slices)
+        else:
+            target = SubredditTarget(subreddit, days=args.days or DEFAULT_TIME_PERIOD_DAYS)
+        targets.append(target)
+    for username in args.user:
+        targets.append(UserTarget(username, args.user_subreddit, since=args.user_since, strategy=args.user_strategy, include_comments=args.user_comments))
+    for target in targets:
+        target.output_file = os.path.join(args.output_dir, target.default_output_file(args.format))
+
+    engine = create_engine(parser, args, incremental=args.incremental, resume=args.resume,
+                           checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_every, restart=args.restart)
+    failures = engine.run(targets)
+    engine.close()
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
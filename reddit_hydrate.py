@@ -0,0 +1,112 @@
+"""
+Bulk comment hydration through batched api/morechildren requests.
+
+replace_more() resolves MoreComments stubs one request each, largest first,
+so a busy thread costs dozens of sequential round-trips. CommentHydrator
+instead gathers the child IDs of every stub in the tree, requests them
+MORECHILDREN_BATCH at a time with several batches in flight, and rebuilds
+the tree locally. The flattened result is the same list, in the same
+order, as comments.list() after replace_more(limit=None).
+"""
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from praw.const import API_PATH
+from praw.models import MoreComments
+
+MORECHILDREN_BATCH = 100 # Most comment IDs api/morechildren accepts per request
+DEFAULT_HYDRATE_WORKERS = 4
+
+
+class CommentHydrator:
+    """Resolves MoreComments stubs in batches on a small pool of PRAW sessions.
+
+    For every batch a pool thread asks ``reddit_factory`` for a Reddit
+    instance of its own thread (see ClientPool.reddit). One hydrator can serve several submissions at once,
+    so the batches of every thread being fetched share the pool.
+    """
+
+    def __init__(self, reddit_factory, workers=DEFAULT_HYDRATE_WORKERS):
+        self._reddit_factory = reddit_factory
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _more_children(self, submission, children):
+        """Fetches up to MORECHILDREN_BATCH comments (and their descendants) as one flat list."""
+        data = {"children": ",".join(children), "link_id": submission.fullname, "sort": submission.comment_sort}
+        return self._reddit_factory().post(API_PATH["morechildren"], data=data)
+
+    def _continue_thread(self, submission, parent_id):
+        """Fetches the replies behind a "continue this thread" stub, like MoreComments.comments()."""
+        path = f"{API_PATH['submission'].format(id=submission.id)}_/{parent_id.split('_', 1)[1]}"
+        _, comments = self._reddit_factory().get(path, params={"limit": submission.comment_limit, "sort": submission.comment_sort})
+        return list(comments.children[0].replies)
+
+    def comments(self, submission):
+        """Returns every comment of a submission, flattened breadth-first like comments.list().
+
+        Batches are requested concurrently but applied in order (see CommentTree).
+        """
+        tree = CommentTree(submission)
+        while tree.pending or tree.continued:
+            batches, continued = tree.take()
+            futures = [self._executor.submit(self._more_children, submission, batch) for batch in batches]
+            futures += [self._executor.submit(self._continue_thread, submission, parent_id) for parent_id in continued]
+            for future in futures:
+                tree.place(future.result())
+        return tree.flatten()
+
+
+class CommentTree:
+    """The comments of one submission, rebuilt as MoreComments stubs are resolved.
+
+    Comments are attached to their parent's replies in the order they are
+    placed, exactly as replace_more() inserts them: inline replies first,
+    then each stub's children in stub and response order. Stubs are
+    recognised as instances of ``more_comments`` (PRAW's or Async PRAW's
+    MoreComments).
+    """
+
+    def __init__(self, submission, more_comments=MoreComments):
+        self.fullname = submission.fullname
+        self._more_comments = more_comments
+        self._replies = collections.defaultdict(list) # Parent fullname -> child comments
+        self._seen = set()
+        self.pending = [] # Child IDs of morechildren stubs, in tree order
+        self.continued = [] # Parents of "continue this thread" stubs
+        self.place(submission.comments)
+
+    def place(self, things):
+        for thing in things:
+            if isinstance(thing, self._more_comments):
+                if thing.count == 0 and not thing.children:
+                    self.continued.append(thing.parent_id)
+                else:
+                    self.pending.extend(thing.children)
+            elif thing.fullname not in self._seen:
+                self._seen.add(thing.fullname)
+                self._replies[thing.parent_id].append(thing)
+                self.place(thing.replies) # Empty for morechildren results, which arrive flat
+
+    def take(self):
+        """Returns (child ID batches, continued parents) still to fetch, and clears them.
+
+        Results must then be placed in that order: batches first, then continued threads.
+        """
+        batches = [self.pending[i:i + MORECHILDREN_BATCH] for i in range(0, len(self.pending), MORECHILDREN_BATCH)]
+        continued = self.continued
+        self.pending, self.continued = [], []
+        return batches, continued
+
+    def flatten(self):
+        """Every comment placed so far, breadth-first like comments.list()."""
+        flattened = []
+        queue = collections.deque(self._replies[self.fullname])
+        while queue:
+            comment = queue.popleft()
+            flattened.append(comment)
+            queue.extend(self._replies[comment.fullname])
+        return flattened
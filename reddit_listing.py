@@ -0,0 +1,88 @@
+"""
+Submission listings, either as PRAW objects or straight from the raw JSON.
+
+The downloaders page through three listings: a subreddit's new posts,
+subreddit-scoped search and a user's submissions. Normally these are PRAW
+ListingGenerators. With ``raw=True`` (the --posts-only mode) each page is
+requested with reddit.request() and its posts are wrapped in ListedPost,
+which only reads the listing data and can never trigger a lazy fetch, so
+every page of LISTING_PAGE posts costs exactly one request.
+"""
+
+from praw.const import API_PATH
+
+LISTING_PAGE = 100 # Most posts Reddit returns per listing request
+LISTING_CAP = 1000 # Reddit stops serving a listing after about this many items
+
+
+def near_listing_cap(listed):
+    """True if a listing that ran out after ``listed`` items may have been cut off by LISTING_CAP.
+
+    A listing that ends well short of the cap simply has no older items.
+    """
+    return listed > LISTING_CAP - LISTING_PAGE
+
+
+class ListedPost:
+    """A submission read from a listing page.
+
+    Attributes are the keys of the listing's post data, with ``fullname`` as
+    for PRAW objects and a deleted author as None, so str(post.author) and
+    str(post.subreddit) give what they give for a PRAW Submission. A key the
+    listing did not include raises AttributeError instead of fetching the post.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(f"Listing data has no {name!r} field") from None
+        if name == "author" and value == "[deleted]":
+            return None
+        return value
+
+    @property
+    def fullname(self):
+        return self._data["name"]
+
+
+def raw_listing(reddit, path, params=None, limit=None):
+    """Yields the ListedPosts of a listing endpoint (up to ``limit``), one request per page."""
+    params = dict(params or {}, limit=min(limit or LISTING_PAGE, LISTING_PAGE))
+    count = 0
+    while True:
+        data = reddit.request(method="GET", path=path, params=params)["data"]
+        for child in data["children"]:
+            yield ListedPost(child["data"])
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if not data["children"] or not data["after"] or data["after"] == params.get("after"):
+            return
+        params["after"] = data["after"]
+
+
+def new_posts(reddit, subreddit, params=None, limit=None, raw=False):
+    """Yields a subreddit's posts, newest first, like subreddit.new()."""
+    if raw:
+        return raw_listing(reddit, f"{API_PATH['subreddit'].format(subreddit=subreddit)}new", params, limit)
+    return reddit.subreddit(subreddit).new(limit=limit, params=params)
+
+
+def search_posts(reddit, subreddit, query, raw=False):
+    """Yields subreddit-scoped search results for a Lucene query, newest first."""
+    if raw:
+        params = {"q": query, "restrict_sr": True, "sort": "new", "syntax": "lucene", "t": "all"}
+        return raw_listing(reddit, API_PATH["search"].format(subreddit=subreddit), params)
+    return reddit.subreddit(subreddit).search(query, sort="new", syntax="lucene", limit=None)
+
+
+def user_posts(reddit, username, params=None, raw=False):
+    """Yields a user's submissions, newest first, like redditor.submissions.new()."""
+    if raw:
+        return raw_listing(reddit, f"{API_PATH['user'].format(user=username)}submitted", dict(params or {}, sort="new"))
+    # Unlike subreddit.new(), PRAW adds the sort to params here, so they cannot be None
+    return reddit.redditor(username).submissions.new(limit=None, params=dict(params or {}))
@@ -0,0 +1,309 @@
+"""
+Run metrics for the downloaders: counters, histograms and progress.
+
+Metrics collects request latency per endpoint, the time spent fetching
+each comment tree, comments per post, rate-limit sleep time and output
+bytes, and estimates the time left from how far the listing has got
+through the target's date range. They can be scraped in Prometheus' text
+format from a local HTTP endpoint (--metrics-port) and are saved as a JSON
+run report at the end (--metrics-report), which lists the slowest threads
+and the time spent in each phase.
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+from reddit_cache import classify
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+THREAD_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COMMENT_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+SLOWEST_THREADS = 10 # Threads listed in the run report
+PROGRESS_INTERVAL = 30 # Seconds between progress lines in quiet mode
+
+OTHER_ENDPOINTS = {"/api/info": "info", "/api/v1/me": "me", "/api/v1/access_token": "token"}
+
+
+def endpoint(method, url):
+    """Groups a request under the cache's endpoint names, plus info, me, token and other."""
+    return classify(method, url) or OTHER_ENDPOINTS.get(urlsplit(url).path.rstrip("/"), "other")
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class Histogram:
+    """Observation counts per bucket (upper bounds), with their sum and maximum."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "max": round(self.max, 3) if self.max is not None else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+class Metrics:
+    """Thread-safe metrics of one run, shared by every session and target.
+
+    ``budgets`` are the run's RateBudgets, one per account, named by
+    ``names``; their request, retry and sleep totals are read whenever the
+    metrics are exported, summed and (with several accounts) per account.
+    """
+
+    def __init__(self, budgets=(), names=()):
+        self.budgets = list(zip(names or [str(i) for i in range(len(budgets))], budgets))
+        self.started_at = datetime.utcnow().isoformat() + "Z"
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._requests = {} # (endpoint, status) -> count
+        self._latency = {} # endpoint -> Histogram
+        self._threads = Histogram(THREAD_BUCKETS)
+        self._comments = Histogram(COMMENT_BUCKETS)
+        self._slowest = [] # Min-heap of (seconds, post ID, comments)
+        self._write_seconds = 0.0
+        self._targets = []
+        self._target = None
+
+    def request(self, endpoint, status, seconds):
+        with self._lock:
+            self._requests[endpoint, status] = self._requests.get((endpoint, status), 0) + 1
+            self._latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(seconds)
+
+    def thread(self, post_id, seconds, comments):
+        """Records the time spent fetching and expanding one post's comment tree."""
+        with self._lock:
+            self._threads.observe(seconds)
+            entry = (seconds, post_id, comments)
+            if len(self._slowest) < SLOWEST_THREADS:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def start_target(self, description, window, output_files):
+        """Starts tracking a target; ``window`` is its (start, end) date range, if it has one."""
+        with self._lock:
+            self._target = {
+                "target": description, "posts": 0, "comments": 0, "started": time.monotonic(),
+                "window": window, "position": None, "output_files": output_files,
+            }
+            self._targets.append(self._target)
+
+    def post_written(self, created_utc, comments, write_seconds):
+        """Records a post of the current target; ``comments`` is None in posts-only runs."""
+        with self._lock:
+            self._target["posts"] += 1
+            self._target["position"] = created_utc
+            self._write_seconds += write_seconds
+            if comments is not None:
+                self._target["comments"] += comments
+                self._comments.observe(comments)
+
+    def finish_target(self, succeeded):
+        with self._lock:
+            self._target.update(succeeded=succeeded, seconds=time.monotonic() - self._target["started"],
+                                output_bytes=self._output_bytes(self._target))
+
+    @staticmethod
+    def _output_bytes(target):
+        if "output_bytes" in target:
+            return target["output_bytes"]
+        return sum(os.path.getsize(path) for path in target["output_files"] if os.path.exists(path))
+
+    def _progress(self):
+        """(fraction of the current target's date range listed, seconds left), either may be None."""
+        target = self._target
+        if target is None or target["window"] is None or target["position"] is None or "seconds" in target:
+            return None, None
+        start, end = target["window"]
+        fraction = min(max((end - target["position"]) / max(end - start, 1), 0.0), 1.0)
+        if fraction <= 0:
+            return fraction, None
+        elapsed = time.monotonic() - target["started"]
+        return fraction, elapsed * (1 - fraction) / fraction
+
+    def progress_line(self):
+        with self._lock:
+            target = self._target
+            fraction, eta = self._progress()
+            requests_made = sum(self._requests.values())
+        line = f"  {target['posts']} posts, {target['comments']} comments, {requests_made} requests so far"
+        if fraction is not None:
+            line += f", {fraction:.0%} of the date range"
+        if eta is not None:
+            line += f", about {format_duration(eta)} left"
+        return line
+
+    def prometheus(self):
+        """The metrics in Prometheus' text exposition format."""
+        lines = []
+
+        def sample(name, labels, value):
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+        def metric(name, kind, help_text, samples):
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"))
+            lines.extend(sample(name, labels, value) for labels, value in samples)
+
+        def histogram(name, help_text, histograms):
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} histogram"))
+            for labels, hist in histograms:
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(sample(f"{name}_bucket", labels + (("le", bound),), cumulative))
+                lines.append(sample(f"{name}_sum", labels, round(hist.sum, 3)))
+                lines.append(sample(f"{name}_count", labels, hist.count))
+
+        with self._lock:
+            posts = sum(target["posts"] for target in self._targets)
+            comments = sum(target["comments"] for target in self._targets)
+            output_bytes = sum(self._output_bytes(target) for target in self._targets)
+            fraction, eta = self._progress()
+            metric("reddit_requests_total", "counter", "API requests sent, by endpoint and status.",
+                   [((("endpoint", name), ("status", status)), count) for (name, status), count in sorted(self._requests.items(), key=str)])
+            histogram("reddit_request_seconds", "API request latency, by endpoint.",
+                      [((("endpoint", name),), hist) for name, hist in sorted(self._latency.items())])
+            histogram("reddit_comment_tree_seconds", "Time to fetch and expand one post's comment tree.", [((), self._threads)])
+            histogram("reddit_comments_per_post", "Comments written per post.", [((), self._comments)])
+            metric("reddit_posts_total", "counter", "Posts written.", [((), posts)])
+            metric("reddit_comments_total", "counter", "Comments written.", [((), comments)])
+            metric("reddit_output_bytes", "gauge", "Bytes written to the output files.", [((), output_bytes)])
+            metric("reddit_write_seconds_total", "counter", "Time spent writing posts to the output.", [((), round(self._write_seconds, 3))])
+            if fraction is not None:
+                metric("reddit_progress_ratio", "gauge", "Fraction of the current target's date range listed.", [((), round(fraction, 4))])
+            if eta is not None:
+                metric("reddit_eta_seconds", "gauge", "Estimated seconds left for the current target.", [((), round(eta))])
+        if self.budgets:
+            # One unlabelled sample for a single account, else one per account
+            labels = (lambda name: ()) if len(self.budgets) == 1 else (lambda name: (("client", name),))
+            metric("reddit_rate_limit_sleep_seconds_total", "counter", "Time spent waiting for the rate budget.",
+                   [(labels(name), round(budget.waited, 3)) for name, budget in self.budgets])
+            metric("reddit_retries_total", "counter", "Requests retried after a 429 or 5xx.",
+                   [(labels(name), budget.retries) for name, budget in self.budgets])
+            metric("reddit_throttled_total", "counter", "429 responses received.",
+                   [(labels(name), budget.throttled) for name, budget in self.budgets])
+            if len(self.budgets) > 1:
+                metric("reddit_client_requests_total", "counter", "Requests sent, by account.",
+                       [(labels(name), budget.requests) for name, budget in self.budgets])
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """The JSON run report: totals, per-target results, the slowest threads and time per phase."""
+        with self._lock:
+            latency = {name: hist.summary() for name, hist in sorted(self._latency.items())}
+            report = {
+                "started_at": self.started_at,
+                "seconds": round(time.monotonic() - self._started, 3),
+                "targets": [
+                    {
+                        "target": target["target"], "succeeded": target.get("succeeded"), "posts": target["posts"],
+                        "comments": target["comments"], "seconds": round(target.get("seconds", time.monotonic() - target["started"]), 3),
+                        "output_bytes": self._output_bytes(target),
+                    }
+                    for target in self._targets
+                ],
+                "requests": {
+                    name: dict(latency[name], statuses={str(status): count for (other, status), count in self._requests.items() if other == name})
+                    for name in latency
+                },
+                "comment_trees": self._threads.summary(),
+                "comments_per_post": self._comments.summary(),
+                "slowest_threads": [{"id": post_id, "seconds": round(seconds, 3), "comments": comments}
+                                    for seconds, post_id, comments in sorted(self._slowest, reverse=True)],
+                "phases": {
+                    "requests": round(sum(hist.sum for hist in self._latency.values()), 3),
+                    "comment_trees": round(self._threads.sum, 3),
+                    "writing": round(self._write_seconds, 3),
+                },
+            }
+        if self.budgets:
+            clients = {name: {"requests": budget.requests, "retries": budget.retries, "throttled": budget.throttled,
+                              "sleep_seconds": round(budget.waited, 3)} for name, budget in self.budgets}
+            report["rate_limit"] = {key: sum(client[key] for client in clients.values())
+                                    for key in ("requests", "retries", "throttled", "sleep_seconds")}
+            report["rate_limit"]["sleep_seconds"] = round(report["rate_limit"]["sleep_seconds"], 3)
+            report["phases"]["rate_limit_sleep"] = report["rate_limit"]["sleep_seconds"]
+            if len(clients) > 1:
+                report["rate_limit"]["clients"] = clients
+        return report
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics on a background thread; returns the server."""
+        server = MetricsServer(self, (host, port))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class InstrumentedSession:
+    """Wraps a requests.Session so every request's latency and status are recorded in Metrics."""
+
+    def __init__(self, metrics, session=None):
+        self._metrics = metrics
+        self._session = session or requests.Session()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.monotonic()
+        status = "error" # Connection failures and timeouts
+        try:
+            response = self._session.request(method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self._metrics.request(endpoint(method, url), status, time.monotonic() - start)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Local HTTP server answering GET /metrics for a Prometheus scraper."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics, address):
+        super().__init__(address, MetricsHandler)
+        self.metrics = metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
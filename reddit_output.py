@@ -0,0 +1,363 @@
+"""
+Output writers shared by the downloaders.
+
+A writer is opened with the run's header metadata (subreddit, download_time,
+...), receives every post through write_post() as soon as that post and its
+comments are finished, and is closed once the run completes.
+"""
+
+import collections
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Only needed for --format parquet
+    pa = pq = None
+PARQUET_SUPPORTED = pa is not None
+
+FORMATS = ("json", "ndjson", "parquet")
+ROW_GROUP_POSTS = 500 # Posts buffered per Parquet row group
+ARCHIVE_COMMENT_FIELDS = ("parent_id",) # Comment fields only the archive keeps; the output layouts do not have them
+
+
+class JsonWriter:
+    """Collects posts and dumps one indented JSON document on close (the original layout).
+
+    With ``spool_file`` the posts are streamed to that NDJSON file instead of
+    being kept in memory, so a checkpointed run can resume from it; the spool
+    is converted to the final document and removed on close.
+    """
+
+    def __init__(self, output_file, header, spool_file=None, resume_offset=None):
+        self.output_file = output_file
+        self._header = header
+        self._posts = []
+        self._user_comments = None
+        self._spool = NdjsonWriter(spool_file, header, resume_offset) if spool_file else None
+
+    def write_post(self, post_info):
+        if self._spool is not None:
+            self._spool.write_post(post_info)
+        else:
+            self._posts.append(post_info)
+
+    def write_user_comments(self, comments):
+        """Stores comments that are not under a written post (a user's comments) as "user_comments"."""
+        self._user_comments = comments
+
+    def offset(self):
+        """Bytes of post data safely on disk (only meaningful with a spool file)."""
+        return self._spool.offset() if self._spool is not None else 0
+
+    def sync(self):
+        if self._spool is not None:
+            self._spool.sync()
+
+    def close(self):
+        posts = self._posts
+        if self._spool is not None:
+            self._spool.close()
+            posts = list(read_posts(self._spool.output_file))
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            data = dict(self._header, posts=posts)
+            if self._user_comments is not None:
+                data["user_comments"] = self._user_comments
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        if self._spool is not None:
+            os.remove(self._spool.output_file)
+
+    def abort(self):
+        """Called when the run fails; only a spool file (if any) is kept."""
+        if self._spool is not None:
+            self._spool.abort()
+
+
+class NdjsonWriter:
+    """Streams one JSON record per line: the header first, then one line per post.
+
+    Each post is flushed as soon as it is written, so memory stays flat and a
+    crash only loses the post that was in progress. With ``resume_offset`` an
+    existing file is truncated to that many bytes and appended to instead.
+    """
+
+    def __init__(self, output_file, header, resume_offset=None):
+        self.output_file = output_file
+        if resume_offset is None:
+            self._file = open(output_file, 'w', encoding='utf-8')
+            self._write_line(header)
+        else:
+            # Drop anything written after the last checkpointed post
+            self._file = open(output_file, 'r+', encoding='utf-8')
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+
+    def _write_line(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def write_post(self, post_info):
+        self._write_line(post_info)
+
+    def write_user_comments(self, comments):
+        """Writes each comment as a {"user_comment": ...} line after the posts."""
+        for comment in comments:
+            self._write_line({"user_comment": comment})
+
+    def offset(self):
+        """Bytes written so far; every byte before it belongs to a complete line."""
+        return self._file.tell()
+
+    def sync(self):
+        """Forces everything written so far onto disk."""
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        # Everything written so far is already on disk; keep it.
+        self._file.close()
+
+
+def comments_file(output_file):
+    """Path of the comments table written next to a Parquet posts table."""
+    base = output_file[:-len(".parquet")] if output_file.endswith(".parquet") else output_file
+    return base + ".comments.parquet"
+
+
+def _parquet_schemas(header):
+    """Schemas of the posts and comments tables, with the run header as metadata.
+
+    The columns are the post_info/comment_info fields; the user downloader's
+    posts have no author or num_comments. Comments add the post's ID as
+    link_id and their position in the post's comment list (null for a
+    user's comments on other posts). Posts-only runs have no comments table
+    (None) and keep only the header's "fields", if given.
+    """
+    author = pa.dictionary(pa.int32(), pa.string())
+    timestamp = pa.timestamp("ms", tz="UTC") # Parquet's coarsest unit
+    post_fields = [
+        ("id", pa.string()), ("title", pa.string()), ("author", author), ("url", pa.string()),
+        ("permalink", pa.string()), ("created_utc", timestamp), ("score", pa.int64()),
+        ("upvote_ratio", pa.float64()), ("selftext", pa.string()), ("num_comments", pa.int64()),
+    ]
+    if "username" in header:
+        post_fields = [field for field in post_fields if field[0] not in ("author", "num_comments")]
+    if "fields" in header:
+        post_fields = [field for field in post_fields if field[0] in header["fields"]]
+    comment_fields = [
+        ("link_id", pa.string()), ("position", pa.int32()), ("id", pa.string()), ("author", author),
+        ("body", pa.string()), ("score", pa.int64()), ("created_utc", timestamp),
+        ("permalink", pa.string()),
+    ]
+    metadata = {"header": json.dumps(header, ensure_ascii=False)}
+    comment_schema = None if header.get("posts_only") else pa.schema(comment_fields, metadata=metadata)
+    return pa.schema(post_fields, metadata=metadata), comment_schema
+
+
+def _table(schema, rows):
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_timestamp(field.type):
+            values = [None if value is None else round(value * 1000) for value in values]
+            columns.append(pa.array(values, pa.int64()).cast(field.type))
+        elif pa.types.is_dictionary(field.type):
+            columns.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class ParquetWriter:
+    """Writes posts and comments as two Parquet tables joined on link_id.
+
+    The posts table goes to ``output_file`` and the comments table next to it
+    (see comments_file). Timestamps are typed, authors dictionary-encoded, and
+    a row group is written every ROW_GROUP_POSTS posts. Like JsonWriter, a
+    checkpointed run streams to an NDJSON ``spool_file`` instead and converts
+    it on close, since a Parquet file cannot be appended to after a crash.
+    No row group is then written before the run ends: the spool costs the
+    disk space of an NDJSON output, and close() parses it back. Pass no spool
+    file (--no-checkpoint) to write row groups as posts complete.
+    """
+
+    def __init__(self, output_file, header, spool_file=None, resume_offset=None):
+        if not PARQUET_SUPPORTED:
+            raise RuntimeError("--format parquet needs pyarrow (pip install pyarrow).")
+        self.output_file = output_file
+        self._header = header
+        self._user_comments = []
+        self._spool = NdjsonWriter(spool_file, header, resume_offset) if spool_file else None
+        self._posts = []
+        self._writers = None
+
+    def _open(self):
+        post_schema, comment_schema = _parquet_schemas(self._header)
+        self._writers = (
+            pq.ParquetWriter(self.output_file, post_schema, compression="zstd", use_dictionary=["author"]),
+            pq.ParquetWriter(comments_file(self.output_file), comment_schema, compression="zstd", use_dictionary=["link_id", "author"])
+            if comment_schema is not None else None,
+        )
+
+    def _flush(self, comments=()):
+        if self._writers is None:
+            self._open()
+        posts_writer, comments_writer = self._writers
+        rows = [dict(comment, link_id=post["id"], position=position)
+                for post in self._posts for position, comment in enumerate(post.get("comments", ()))]
+        rows += [dict(comment, link_id=comment["link_id"].split("_", 1)[-1], position=None) for comment in comments]
+        if self._posts:
+            posts_writer.write_table(_table(posts_writer.schema, self._posts))
+        if rows and comments_writer is not None:
+            comments_writer.write_table(_table(comments_writer.schema, rows))
+        self._posts = []
+
+    def write_post(self, post_info):
+        if self._spool is not None:
+            self._spool.write_post(post_info)
+            return
+        self._posts.append(post_info)
+        if len(self._posts) >= ROW_GROUP_POSTS:
+            self._flush()
+
+    def write_user_comments(self, comments):
+        self._user_comments = comments
+
+    def offset(self):
+        return self._spool.offset() if self._spool is not None else 0
+
+    def sync(self):
+        if self._spool is not None:
+            self._spool.sync()
+
+    def _finish(self):
+        self._flush(self._user_comments)
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.close()
+            for post_info in read_posts(self._spool.output_file):
+                self._posts.append(post_info)
+                if len(self._posts) >= ROW_GROUP_POSTS:
+                    self._flush()
+        self._finish()
+        if self._spool is not None:
+            os.remove(self._spool.output_file)
+
+    def abort(self):
+        """Keeps the spool file, or else closes the tables with every post completed so far."""
+        if self._spool is not None:
+            self._spool.abort()
+        else:
+            self._finish()
+
+
+def read_parquet_posts(path):
+    """Yields the post records of a Parquet output, comments included, as in the JSON layout."""
+    def plain(row):
+        if row.get("created_utc") is not None:
+            row["created_utc"] = row["created_utc"].timestamp()
+        return row
+
+    posts = pq.read_table(path)
+    if json.loads(posts.schema.metadata[b"header"]).get("posts_only"):
+        for row in posts.to_pylist():
+            yield plain(row)
+        return
+    comments = collections.defaultdict(list)
+    for row in pq.read_table(comments_file(path)).to_pylist():
+        if row.pop("position") is not None: # Skip a user's comments on other posts
+            comments[row.pop("link_id")].append(plain(row))
+    for row in posts.to_pylist():
+        yield dict(plain(row), comments=comments[row["id"]])
+
+
+def without_archive_fields(comments):
+    return [{key: value for key, value in comment.items() if key not in ARCHIVE_COMMENT_FIELDS} for comment in comments]
+
+
+class TeeWriter:
+    """Sends every post to a primary writer and to extra sinks such as the archive.
+
+    Only sinks with ``archive_fields`` set receive the ARCHIVE_COMMENT_FIELDS
+    of comments; the others get the output layout without them.
+    Offsets and syncing refer to the primary writer, which checkpoints track.
+    """
+
+    def __init__(self, primary, *sinks):
+        self._primary = primary
+        self._sinks = sinks
+        self.output_file = primary.output_file
+
+    def write_post(self, post_info):
+        output_info = post_info
+        if post_info.get("comments"):
+            output_info = dict(post_info, comments=without_archive_fields(post_info["comments"]))
+        self._primary.write_post(output_info)
+        for sink in self._sinks:
+            sink.write_post(post_info if getattr(sink, "archive_fields", False) else output_info)
+
+    def write_user_comments(self, comments):
+        output_comments = without_archive_fields(comments)
+        self._primary.write_user_comments(output_comments)
+        for sink in self._sinks:
+            sink.write_user_comments(comments if getattr(sink, "archive_fields", False) else output_comments)
+
+    def offset(self):
+        return self._primary.offset()
+
+    def sync(self):
+        self._primary.sync()
+
+    def close(self):
+        self._primary.close()
+        for sink in self._sinks:
+            sink.close()
+
+    def abort(self):
+        self._primary.abort()
+        for sink in self._sinks:
+            sink.abort()
+
+
+def open_writer(output_format, output_file, header, spool_file=None, resume_offset=None):
+    """Returns the writer for output_format ("json", "ndjson" or "parquet").
+
+    ``spool_file`` (json and parquet) and ``resume_offset`` are used by checkpointed
+    runs; see JsonWriter and NdjsonWriter.
+    """
+    if output_format == "ndjson":
+        return NdjsonWriter(output_file, header, resume_offset)
+    if output_format == "parquet":
+        return ParquetWriter(output_file, header, spool_file, resume_offset)
+    return JsonWriter(output_file, header, spool_file, resume_offset)
+
+
+def read_posts(path):
+    """Yields the post records of an output file written in any format."""
+    if path.endswith(".parquet"):
+        yield from read_parquet_posts(path)
+        return
+    with open(path, encoding='utf-8') as f:
+        try:
+            json.loads(f.readline()) # An NDJSON header is a complete JSON line
+        except ValueError:
+            f.seek(0)
+            yield from json.load(f)["posts"]
+            return
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if "id" in record: # Skip {"user_comment": ...} lines
+                    yield record
+
+
+def default_extension(output_format):
+    """File extension used for default output file names."""
+    return output_format if output_format in ("ndjson", "parquet") else "json"
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Record Reddit API exchanges to cassettes and serve them back locally.
+
+A cassette is a gzip-compressed JSON-lines file with one request and its
+response per line, written by the downloaders' --record option. The replay
+server answers the same requests from a cassette, with optional latency,
+Reddit-style rate-limit headers and injected errors, so downloads can be
+run and benchmarked (see reddit_benchmark.py) without credentials or
+network access. Point the downloaders at it with the REDDIT_OAUTH_URL and
+REDDIT_URL environment variables.
+"""
+
+import argparse
+import base64
+import collections
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from reddit_accounts import NUMBERED_CLIENT_ID
+from reddit_cache import UNCACHED_HEADERS
+
+# Token exchanges carry the account password, so they are never recorded;
+# the replay server hands out a dummy token instead, which names the client.
+TOKEN_PATH = "/api/v1/access_token"
+TOKEN_RESPONSE = {"access_token": "replay", "token_type": "bearer", "expires_in": 24 * 60 * 60, "scope": "*"}
+TOKEN_PREFIX = "replay:"
+
+DEFAULT_WINDOW = 600 # Seconds in Reddit's rate-limit window
+
+
+def request_key(method, path, params=None, data=None):
+    """Identifies a request independently of how its parameters were passed."""
+    def pairs(values):
+        items = values.items() if isinstance(values, dict) else values or []
+        return sorted((str(name), str(value)) for name, value in items)
+    return json.dumps([method.upper(), path, pairs(params), pairs(data)])
+
+
+def replay_environment(url, accounts=1):
+    """Environment for a downloader process that talks to a local server at ``url`` with dummy credentials.
+
+    Real numbered accounts are left out; with ``accounts`` > 1, numbered fake
+    accounts are added, each a client ID with its own rate-limit window.
+    """
+    env = dict(os.environ,
+               REDDIT_OAUTH_URL=url, REDDIT_URL=url,
+               REDDIT_CLIENT_ID="replay", REDDIT_CLIENT_SECRET="replay",
+               REDDIT_USERNAME="replay", REDDIT_PASSWORD="replay")
+    for name in [name for name in env if NUMBERED_CLIENT_ID.fullmatch(name)]:
+        del env[name] # Never use real accounts from the environment
+    if accounts > 1:
+        for number in range(1, accounts + 1):
+            env.update({f"REDDIT_{key}_{number}": f"replay{number}" for key in ("CLIENT_ID", "CLIENT_SECRET", "USERNAME", "PASSWORD")})
+    return env
+
+
+class Cassette:
+    """Thread-safe writer of recorded exchanges."""
+
+    def __init__(self, path):
+        self.path = path
+        self.exchanges = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def record(self, method, url, params, data, response):
+        entry = {
+            "method": method.upper(),
+            "path": urlsplit(url).path,
+            "params": params,
+            "data": data if isinstance(data, (dict, list, type(None))) else None,
+            "status": response.status_code,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in UNCACHED_HEADERS and not name.lower().startswith("x-ratelimit")
+                        and name.lower() != "set-cookie"},
+            "body": response.content.decode('utf-8', errors='replace'),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.exchanges += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_cassette(path):
+    """Returns {request_key: [exchange, ...]} in recorded order.
+
+    A cassette cut short by an interrupted recording is read up to the last
+    complete exchange.
+    """
+    exchanges = collections.defaultdict(list)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                entry = json.loads(line)
+                exchanges[request_key(entry["method"], entry["path"], entry["params"], entry["data"])].append(entry)
+        except (EOFError, ValueError):
+            pass # Truncated stream or torn last line
+    return exchanges
+
+
+class RecordingSession:
+    """Wraps a requests.Session so successful API exchanges are written to a Cassette.
+
+    Throttled and failed responses are left out; the replay server injects
+    its own errors.
+    """
+
+    def __init__(self, cassette, session=None):
+        self._cassette = cassette
+        self._session = session or requests.Session()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        response = self._session.request(method, url, params=params, data=data, **kwargs)
+        if response.status_code < 400 and urlsplit(url).path.rstrip("/") != TOKEN_PATH:
+            self._cassette.record(method, url, params, data, response)
+        return response
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP server answering Reddit API requests from a cassette.
+
+    Each request gets the recorded responses for it in order, repeating the
+    last one once they run out. ``latency`` (plus up to ``jitter``) seconds
+    are added to every response. With ``rate_limit``, Reddit's
+    X-Ratelimit-Used/Remaining/Reset headers are sent for a window of
+    ``window`` seconds and requests beyond the limit get a 429; like Reddit,
+    every client ID has a window of its own. ``client_rate_limits`` maps
+    client IDs to limits of their own, to throttle some clients harder
+    than others. A fraction
+    ``error_rate`` of requests fail with ``error_status``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, cassette_path, address=("127.0.0.1", 0), latency=0.0, jitter=0.0,
+                 rate_limit=None, window=DEFAULT_WINDOW, error_rate=0.0, error_status=503, seed=None, verbose=False,
+                 client_rate_limits=None):
+        super().__init__(address, ReplayHandler)
+        self.exchanges = load_cassette(cassette_path)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.client_rate_limits = client_rate_limits or {}
+        self.window = window
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.verbose = verbose
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.unmatched = 0
+        self._random = random.Random(seed)
+        self._served = collections.Counter()
+        self._windows = {} # client ID -> [window start, requests used]
+        self.client_requests = collections.Counter()
+        self.paths = collections.Counter() # Requests per path, without the trailing slash
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves on a background thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_counters(self):
+        """Starts a new run: clears the counters and replays every request from its first response."""
+        with self._lock:
+            self.requests = self.throttled = self.errors = self.unmatched = 0
+            self._served.clear()
+            self.client_requests.clear()
+            self.paths.clear()
+
+    def respond(self, method, path, params, data, client=None):
+        """Returns (status, headers, body) for one request of ``client`` (a client ID, if known)."""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        with self._lock:
+            self.requests += 1
+            self.client_requests[client] += 1
+            self.paths[path.rstrip("/")] += 1
+            headers = {}
+            rate_limit = self.client_rate_limits.get(client, self.rate_limit)
+            if rate_limit is not None:
+                now = time.time()
+                window = self._windows.setdefault(client, [now, 0])
+                if now - window[0] >= self.window:
+                    window[:] = [now, 0]
+                window[1] += 1
+                reset = max(int(self.window - (now - window[0])), 0)
+                headers = {
+                    "x-ratelimit-used": str(window[1]),
+                    "x-ratelimit-remaining": str(max(rate_limit - window[1], 0)),
+                    "x-ratelimit-reset": str(reset),
+                }
+                if window[1] > rate_limit:
+                    self.throttled += 1
+                    return 429, dict(headers, **{"content-type": "application/json"}), b'{"message": "Too Many Requests", "error": 429}'
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return self.error_status, dict(headers, **{"content-type": "text/plain"}), b"injected error"
+
+            if path.rstrip("/") == TOKEN_PATH:
+                token = dict(TOKEN_RESPONSE, access_token=TOKEN_PREFIX + (client or ""))
+                return 200, dict(headers, **{"content-type": "application/json"}), json.dumps(token).encode()
+
+            key = request_key(method, path, params, data)
+            recorded = self.exchanges.get(key)
+            if not recorded:
+                self.unmatched += 1
+                if self.verbose:
+                    print(f"No recorded response for {key}")
+                return 404, dict(headers, **{"content-type": "application/json"}), b'{"message": "Not Found", "error": 404}'
+            entry = recorded[min(self._served[key], len(recorded) - 1)]
+            self._served[key] += 1
+        return entry["status"], dict(entry["headers"], **headers), entry["body"].encode('utf-8')
+
+    def summary(self):
+        summary = (f"Replay server: {self.requests} requests, {self.throttled} throttled, "
+                   f"{self.errors} injected errors, {self.unmatched} without a recorded response.")
+        clients = [client for client in self.client_requests if client is not None]
+        if len(clients) > 1:
+            summary += " Requests per client: " + ", ".join(f"{client} {self.client_requests[client]}" for client in sorted(clients)) + "."
+        return summary
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Headers and body are written separately
+
+    def _client(self):
+        """The client ID of the token exchange's Basic credentials or of the bearer token handed out for it."""
+        scheme, _, credentials = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() == "basic":
+            try:
+                return base64.b64decode(credentials).decode('utf-8').split(":", 1)[0]
+            except ValueError:
+                return None
+        if scheme.lower() == "bearer" and credentials.startswith(TOKEN_PREFIX):
+            return credentials[len(TOKEN_PREFIX):] or None
+        return None
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ""
+        data = parse_qsl(body, keep_blank_values=True) if body else None
+        params = parse_qsl(url.query, keep_blank_values=True)
+        status, headers, content = self.server.respond(self.command, url.path, params, data, self._client())
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    """Main function to parse arguments and serve a cassette."""
+    parser = argparse.ArgumentParser(description="Serve a cassette recorded with --record as a local stand-in for the Reddit API.")
+    parser.add_argument("cassette", help="Cassette file written by a downloader's --record option.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on. Defaults to 8080.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds added to every response, at random.")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Requests allowed per window; sends Reddit's rate-limit headers and answers 429 beyond it.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help=f"Length of the rate-limit window in seconds. Defaults to {DEFAULT_WINDOW}.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with --error-status.")
+    parser.add_argument("--error-status", type=int, default=503, help="Status code of injected errors. Defaults to 503.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency jitter and error injection.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request and every request without a recorded response.")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.cassette, ("127.0.0.1", args.port), args.latency, args.jitter,
+                          args.rate_limit, args.window, args.error_rate, args.error_status, args.seed, args.verbose)
+    print(f"Serving {sum(len(v) for v in server.exchanges.values())} recorded exchanges at {server.url}")
+    print(f"Run a downloader with: REDDIT_OAUTH_URL={server.url} REDDIT_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(server.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Time-sliced backfill of a subreddit date range.
+
+subreddit.new() can only be paged backwards from the newest post, so an old
+date range first pages through everything newer, and Reddit stops serving a
+listing after about 1000 posts. Instead the range is split into slices and
+each slice's listing starts right after the subreddit's first submission
+created past the slice's end. Submission IDs increase with creation time,
+so that submission is found by probing IDs through /api/info. Slices are
+then independent and can be listed concurrently.
+"""
+
+import string
+
+from reddit_listing import near_listing_cap, new_posts
+
+INFO_BATCH = 100 # Fullnames per /api/info request
+
+BASE36_DIGITS = string.digits + string.ascii_lowercase
+
+
+def to_base36(number):
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36_DIGITS[digit] + digits
+        if number == 0:
+            return digits
+
+
+def split_window(start_timestamp, end_timestamp, count):
+    """Splits [start_timestamp, end_timestamp] into ``count`` equal (start, end) slices, newest first."""
+    width = (end_timestamp - start_timestamp) / count
+    bounds = [start_timestamp + width * i for i in range(count)] + [end_timestamp]
+    return [(bounds[i], bounds[i + 1]) for i in reversed(range(count))]
+
+
+def find_listing_start(reddit, subreddit_name, timestamp, low, high):
+    """Returns the fullname of a submission of the subreddit created shortly after ``timestamp``, or None.
+
+    ``high`` must be the base-10 ID of a submission created after timestamp.
+    Each request probes INFO_BATCH - 1 evenly spaced IDs between low and high
+    and narrows the range to the two probes around timestamp, so a handful
+    of requests pin it down to about INFO_BATCH IDs, which are then probed
+    one by one. IDs are shared by every subreddit, so any post narrows the
+    range, but only a post of this subreddit can start its listing: the
+    oldest one found after timestamp is returned. IDs that no longer
+    resolve are simply not returned and skipped.
+    """
+    start = None # (ID, fullname) of the oldest post of the subreddit found after timestamp
+
+    def probe(ids):
+        nonlocal start
+        found = []
+        for submission in reddit.info(fullnames=[f"t3_{to_base36(probe_id)}" for probe_id in ids]):
+            submission_id = int(submission.id, 36)
+            found.append((submission_id, submission.created_utc))
+            if (submission.created_utc > timestamp and str(submission.subreddit).lower() == subreddit_name.lower()
+                    and (start is None or submission_id < start[0])):
+                start = (submission_id, submission.fullname)
+        return sorted(found)
+
+    while high - low > INFO_BATCH:
+        step = (high - low) / INFO_BATCH
+        found = probe(sorted({int(low + step * i) for i in range(1, INFO_BATCH)}))
+        narrowed_low, narrowed_high = low, high
+        for submission_id, created_utc in found:
+            if created_utc <= timestamp:
+                narrowed_low = submission_id
+            else:
+                narrowed_high = submission_id
+                break
+        if (narrowed_low, narrowed_high) == (low, high):
+            break # Nothing resolved inside the range; use the best start found so far
+        low, high = narrowed_low, narrowed_high
+    else:
+        if high - low > 1:
+            probe(range(low + 1, high))
+    return start[1] if start is not None else None
+
+
+def walk_slice(reddit, subreddit_name, start_timestamp, end_timestamp, after=None, raw=False):
+    """Lists the subreddit's submissions created in [start_timestamp, end_timestamp], newest first.
+
+    Returns (submissions, covered). ``covered`` is True once the listing
+    reached a post older than start_timestamp. A listing from the newest
+    post that ran out well short of Reddit's listing cap is covered too
+    (there are no older posts). Reddit's cap counts from the newest post,
+    so a listing that started ``after`` a post further down may have been
+    cut off after any number of posts, and one that ran out is never covered.
+    """
+    submissions = []
+    listed = 0
+    params = {"after": after} if after else None
+    for submission in new_posts(reddit, subreddit_name, params, raw=raw):
+        listed += 1
+        if submission.created_utc < start_timestamp:
+            return submissions, True
+        if submission.created_utc <= end_timestamp:
+            submissions.append(submission)
+    return submissions, after is None and not near_listing_cap(listed)
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Deduplicated SQLite store for repeated snapshots of the same target.
+
+Running a downloader on a schedule writes a full copy of the window every
+time, although most posts and comments have not changed since the last
+run. The snapshot store (--snapshots) keeps each distinct record once,
+keyed on a hash of its content, and remembers for every item the runs
+("snapshots") during which it had that content: a validity interval from
+its first to its last snapshot. An unchanged item only extends its open
+interval. A changed item, or one that disappeared and came back, starts a
+new interval. Snapshots of the same target (the run header without its
+download time) form a series.
+
+The rebuild command writes any snapshot back out in the downloaders' JSON
+layout, and history lists how one post or comment changed over time.
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    series INTEGER NOT NULL REFERENCES series(id),
+    taken_at TEXT NOT NULL,
+    header TEXT NOT NULL,
+    user_comments INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS intervals (
+    series INTEGER NOT NULL REFERENCES series(id),
+    item_id TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES objects(hash),
+    first_snapshot INTEGER NOT NULL,
+    last_snapshot INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_series ON snapshots (series, id);
+CREATE INDEX IF NOT EXISTS intervals_series_last ON intervals (series, last_snapshot);
+CREATE INDEX IF NOT EXISTS intervals_item ON intervals (item_id, first_snapshot);
+"""
+
+BATCH_SIZE = 50 # Posts per write transaction
+
+# Item IDs: "post:<id>", "comment:<id>", "user_comment:<id>" and "order:<post id>",
+# the order of a post's comments (breadth-first, as Reddit sorted the siblings).
+# Posts are rebuilt newest first, as every listing returns them.
+
+
+def connect(snapshot_file):
+    """Opens (and if needed creates) the store in WAL mode."""
+    db = sqlite3.connect(snapshot_file)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def series_key(header):
+    """Identifies the target of a run: its header without the download time."""
+    return json.dumps({key: value for key, value in header.items() if key != "download_time"}, sort_keys=True, ensure_ascii=False)
+
+
+def series_id(db, header):
+    """The ID of the run's series, added if it is new."""
+    target = series_key(header)
+    db.execute("INSERT OR IGNORE INTO series (target) VALUES (?)", (target,))
+    return db.execute("SELECT id FROM series WHERE target = ?", (target,)).fetchone()[0]
+
+
+def encode(record):
+    """(hash, body) of a record.
+
+    Keys keep the downloaders' order, which is fixed, so equal records get
+    the same hash and rebuilt output matches the original files.
+    """
+    body = json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest(), body
+
+
+class SnapshotWriter:
+    """Output writer that adds a run to the snapshot store as one snapshot.
+
+    Only records whose hash is new are stored; every item seen extends or
+    starts its validity interval. A run resumed from a checkpoint keeps the
+    same header, so it continues its unfinished snapshot instead of
+    starting a new one. The snapshot is marked complete on close.
+    """
+
+    def __init__(self, snapshot_file, header):
+        self.snapshot_file = snapshot_file
+        self._db = connect(snapshot_file)
+        self._series = series_id(self._db, header)
+        row = self._db.execute("SELECT id FROM snapshots WHERE series = ? AND taken_at = ? AND complete = 0",
+                               (self._series, header["download_time"])).fetchone()
+        if row is not None:
+            self.snapshot = row["id"]
+        else:
+            self.snapshot = self._db.execute("INSERT INTO snapshots (series, taken_at, header) VALUES (?, ?, ?)",
+                                             (self._series, header["download_time"], json.dumps(header, ensure_ascii=False))).lastrowid
+        previous = self._db.execute("SELECT MAX(id) FROM snapshots WHERE series = ? AND id < ?", (self._series, self.snapshot)).fetchone()[0]
+        self._previous = previous
+        # The intervals still open: item ID -> [rowid, hash, first snapshot, last snapshot]
+        self._open = {}
+        for interval in self._db.execute("SELECT rowid, item_id, hash, first_snapshot, last_snapshot FROM intervals "
+                                         "WHERE series = ? AND last_snapshot IN (?, ?) ORDER BY last_snapshot",
+                                         (self._series, previous if previous is not None else -1, self.snapshot)):
+            self._open[interval["item_id"]] = [interval["rowid"], interval["hash"], interval["first_snapshot"], interval["last_snapshot"]]
+        self._pending = 0
+        self.stored = 0 # Records new to the store
+        self.observed = 0
+
+    def _observe(self, item_id, record):
+        digest, body = encode(record)
+        self.observed += 1
+        if self._db.execute("INSERT OR IGNORE INTO objects (hash, body) VALUES (?, ?)", (digest, body)).rowcount:
+            self.stored += 1
+        interval = self._open.get(item_id)
+        if interval is not None and interval[1] == digest:
+            if interval[3] != self.snapshot:
+                self._db.execute("UPDATE intervals SET last_snapshot = ? WHERE rowid = ?", (self.snapshot, interval[0]))
+                interval[3] = self.snapshot
+            return
+        if interval is not None and interval[3] == self.snapshot:
+            # Seen earlier in this (resumed) snapshot with other content
+            if interval[2] == self.snapshot:
+                self._db.execute("UPDATE intervals SET hash = ? WHERE rowid = ?", (digest, interval[0]))
+                interval[1] = digest
+                return
+            self._db.execute("UPDATE intervals SET last_snapshot = ? WHERE rowid = ?", (self._previous, interval[0]))
+        rowid = self._db.execute("INSERT INTO intervals (series, item_id, hash, first_snapshot, last_snapshot) VALUES (?, ?, ?, ?, ?)",
+                                 (self._series, item_id, digest, self.snapshot, self.snapshot)).lastrowid
+        self._open[item_id] = [rowid, digest, self.snapshot, self.snapshot]
+
+    def write_post(self, post_info):
+        post = {key: value for key, value in post_info.items() if key != "comments"}
+        self._observe(f"post:{post['id']}", post)
+        if "comments" in post_info: # Not in posts-only records
+            for comment in post_info["comments"]:
+                self._observe(f"comment:{comment['id']}", comment)
+            self._observe(f"order:{post['id']}", [comment["id"] for comment in post_info["comments"]])
+        self._pending += 1
+        if self._pending >= BATCH_SIZE:
+            self._db.commit()
+            self._pending = 0
+
+    def write_user_comments(self, comments):
+        for comment in comments:
+            self._observe(f"user_comment:{comment['id']}", comment)
+        self._db.execute("UPDATE snapshots SET user_comments = 1 WHERE id = ?", (self.snapshot,))
+        self._db.commit()
+
+    def close(self):
+        self._db.execute("UPDATE snapshots SET complete = 1 WHERE id = ?", (self.snapshot,))
+        self._db.commit()
+        self._db.close()
+        print(f"Snapshot {self.snapshot} saved to {self.snapshot_file}: {self.stored} of {self.observed} records were new.")
+
+    def abort(self):
+        # Keep what was written; the snapshot stays incomplete (and resumable)
+        self._db.commit()
+        self._db.close()
+
+
+def _items(db, series, snapshot):
+    """Item ID -> record of every item of a series valid in a snapshot."""
+    return {
+        item["item_id"]: json.loads(item["body"])
+        for item in db.execute("SELECT item_id, body FROM intervals JOIN objects USING (hash) "
+                               "WHERE series = ? AND last_snapshot >= ? AND first_snapshot <= ?", (series, snapshot, snapshot))
+    }
+
+
+def newest_first(records):
+    """Sorts posts or comments newest first, like the listings (base36 IDs break ties)."""
+    return sorted(records, key=lambda record: (record.get("created_utc") or 0, int(record["id"], 36)), reverse=True)
+
+
+def rebuild(db, snapshot):
+    """Rebuilds a snapshot in the downloaders' output layout (header and posts)."""
+    snapshot_row = db.execute("SELECT * FROM snapshots WHERE id = ?", (snapshot,)).fetchone()
+    if snapshot_row is None:
+        raise ValueError(f"No snapshot {snapshot}")
+    items = _items(db, snapshot_row["series"], snapshot)
+    posts = []
+    for item_id, post in items.items():
+        if not item_id.startswith("post:"):
+            continue
+        order = items.get(f"order:{post['id']}")
+        if order is not None:
+            post["comments"] = [items[f"comment:{comment_id}"] for comment_id in order]
+        posts.append(post)
+    data = dict(json.loads(snapshot_row["header"]), posts=newest_first(posts))
+    if snapshot_row["user_comments"]:
+        data["user_comments"] = newest_first(record for item_id, record in items.items() if item_id.startswith("user_comment:"))
+    return data
+
+
+def history(db, item):
+    """Every version of a post or comment (ID or fullname), oldest first.
+
+    Returns a list of {"series", "first_snapshot", "last_snapshot", "from",
+    "to", "snapshots", "record"} entries; a gap between two entries means the
+    item was missing from the snapshots in between.
+    """
+    kind, _, item = item.rpartition("_") if item[:3] in ("t1_", "t3_") else ("", "", item)
+    prefixes = {"t3": ("post",), "t1": ("comment", "user_comment")}.get(kind, ("post", "comment", "user_comment"))
+    versions = []
+    for prefix in prefixes:
+        for row in db.execute(
+            "SELECT t.target, i.first_snapshot, i.last_snapshot, o.body, f.taken_at AS first_taken, l.taken_at AS last_taken, "
+            "(SELECT COUNT(*) FROM snapshots s WHERE s.series = i.series AND s.id BETWEEN i.first_snapshot AND i.last_snapshot) AS snapshots "
+            "FROM intervals i JOIN objects o USING (hash) JOIN snapshots f ON f.id = i.first_snapshot JOIN snapshots l ON l.id = i.last_snapshot JOIN series t ON t.id = i.series "
+            "WHERE i.item_id = ? ORDER BY i.first_snapshot",
+            (f"{prefix}:{item}",),
+        ):
+            versions.append({
+                "series": json.loads(row["target"]), "first_snapshot": row["first_snapshot"], "last_snapshot": row["last_snapshot"],
+                "from": row["first_taken"], "to": row["last_taken"], "snapshots": row["snapshots"], "record": json.loads(row["body"]),
+            })
+        if versions:
+            break
+    return versions
+
+
+def list_snapshots(db):
+    return db.execute(
+        "SELECT s.*, t.target, (SELECT COUNT(*) FROM intervals i WHERE i.series = s.series AND i.last_snapshot >= s.id AND i.first_snapshot <= s.id "
+        "AND i.item_id LIKE 'post:%') AS posts FROM snapshots s JOIN series t ON t.id = s.series ORDER BY s.id"
+    ).fetchall()
+
+
+def describe_series(target):
+    target = json.loads(target)
+    if "username" in target:
+        return f"u/{target['username']} in r/{target['subreddit']}"
+    if "time_period_days" in target:
+        return f"r/{target['subreddit']}, last {target['time_period_days']} days"
+    return f"r/{target['subreddit']}, {target['start_date']} to {target['end_date']}"
+
+
+def main():
+    """Main function to parse arguments and run a snapshot store command."""
+    parser = argparse.ArgumentParser(description="Work with the snapshot store written by the downloaders' --snapshots option.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List the stored snapshots.")
+    list_parser.add_argument("store", help="Path to the snapshot store.")
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="Rebuild a snapshot as the downloader's JSON output.")
+    rebuild_parser.add_argument("store", help="Path to the snapshot store.")
+    rebuild_parser.add_argument("snapshot", type=int, help="Snapshot ID (see the list command).")
+    rebuild_parser.add_argument("-o", "--output", required=True, help="Output JSON file name.")
+
+    history_parser = subparsers.add_parser("history", help="Show how a post or comment changed across snapshots.")
+    history_parser.add_argument("store", help="Path to the snapshot store.")
+    history_parser.add_argument("item", help="Post or comment ID, or its fullname (t3_... or t1_...).")
+    history_parser.add_argument("-o", "--output", default=None, help="Save the versions as JSON instead of printing them.")
+
+    args = parser.parse_args()
+    db = connect(args.store)
+
+    if args.command == "list":
+        for row in list_snapshots(db):
+            status = "" if row["complete"] else " (incomplete)"
+            print(f"{row['id']:>6}  {row['taken_at']}  {describe_series(row['target'])}: {row['posts']} posts{status}")
+    elif args.command == "rebuild":
+        try:
+            data = rebuild(db, args.snapshot)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Rebuilding {len(data['posts'])} posts to {args.output}...")
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        print("Data saved successfully.")
+    else:
+        versions = history(db, args.item)
+        if not versions:
+            print(f"Error: no post or comment {args.item} in {args.store}", file=sys.stderr)
+            sys.exit(1)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(versions, f, indent=4, ensure_ascii=False)
+            print(f"Saved {len(versions)} versions to {args.output}")
+        else:
+            for version in versions:
+                record = version["record"]
+                values = ", ".join(f"{key}={record[key]}" for key in ("score", "upvote_ratio", "num_comments") if key in record)
+                if "body" in record:
+                    values += f", body={record['body'][:60]!r}"
+                print(f"{version['from']} to {version['to']} ({version['snapshots']} snapshots): {values}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
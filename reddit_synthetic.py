@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic cassette for the replay server and the benchmark suite.
+
+SyntheticServer is a small local stand-in for the parts of the Reddit API
+the downloaders use: subreddit and user listings, subreddit search, comment
+trees with "load more comments" and "continue this thread" stubs,
+api/morechildren and api/info. Its subreddit is generated from a seed, so
+every run of the generator serves the same posts and comments. The
+generator runs the engine against it with --record, once per scenario the
+benchmark can run, and joins the recordings into one cassette. The result
+can be replayed (see reddit_replay.py) and benchmarked (see
+reddit_benchmark.py) without credentials or network access.
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from reddit_replay import TOKEN_PATH, TOKEN_RESPONSE, load_cassette, replay_environment
+from reddit_slices import to_base36
+
+DEFAULT_SUBREDDIT = "synthetic"
+OTHER_SUBREDDIT = "elsewhere" # Owner of the IDs a subreddit with shared_ids does not use
+DEFAULT_POSTS = 300
+DEFAULT_MAX_COMMENTS = 40
+DEFAULT_HOURS_BETWEEN_POSTS = 3
+DEFAULT_DAYS = 30
+AUTHORS = ("alice", "bob", "carol", "dave", "erin")
+INLINE_REPLIES = 8 # Replies rendered per level; the rest sit behind a "load more comments" stub
+MAX_DEPTH = 4 # Deeper replies sit behind a "continue this thread" stub
+POST_ID_BASE = 36 ** 5 # Submission IDs increase with creation time, as on Reddit
+COMMENT_ID_BASE = 36 ** 6
+UNLIMITED_REQUESTS_PER_MINUTE = 1000000
+ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reddit_engine.py")
+AUTHOR_QUERY = re.compile(r'author:"([^"]+)"')
+
+
+def listing(children, after=None):
+    return {"kind": "Listing", "data": {"after": after, "before": None, "dist": len(children), "children": children}}
+
+
+class SyntheticSubreddit:
+    """A subreddit of ``posts`` posts, newest first, ``hours_between_posts`` apart and ending at ``now``.
+
+    Each post has up to ``max_comments`` comments by AUTHORS, nested at random.
+    Post IDs are ``id_spacing`` apart. With ``shared_ids``, every other ID up
+    to the newest post's belongs to a post of OTHER_SUBREDDIT that api/info
+    returns, as on Reddit, where all subreddits draw from one ID sequence.
+    """
+
+    def __init__(self, name=DEFAULT_SUBREDDIT, posts=DEFAULT_POSTS, max_comments=DEFAULT_MAX_COMMENTS,
+                 hours_between_posts=DEFAULT_HOURS_BETWEEN_POSTS, now=None, seed=0, id_spacing=1, shared_ids=False):
+        self.name = name
+        self.now = time.time() if now is None else now
+        self.shared_ids = shared_ids
+        self._newest_id = POST_ID_BASE + posts * id_spacing
+        self._seconds_per_id = hours_between_posts * 60 * 60 / id_spacing
+        rng = random.Random(seed)
+        self.posts = []
+        self.trees = {} # Post ID -> ({comment ID: comment}, top-level comment IDs)
+        for number in range(posts):
+            post_id = to_base36(POST_ID_BASE + (posts - number) * id_spacing)
+            post = {
+                "id": post_id, "name": f"t3_{post_id}", "title": f"Synthetic post {number}",
+                "author": AUTHORS[number % len(AUTHORS)], "url": f"https://example.com/{post_id}",
+                "permalink": f"/r/{name}/comments/{post_id}/synthetic_post_{number}/",
+                "created_utc": float(int(self.now - number * hours_between_posts * 60 * 60)),
+                "score": rng.randint(0, 500), "upvote_ratio": round(rng.uniform(0.5, 1.0), 2),
+                "selftext": " ".join(rng.choice(("self", "hosted", "server", "backup", "docker")) for _ in range(rng.randint(5, 40))),
+                "subreddit": name, "is_self": True, "archived": False,
+            }
+            self.trees[post_id] = self._tree(post, number, rng.randint(0, max_comments), rng)
+            post["num_comments"] = len(self.trees[post_id][0])
+            self.posts.append(post)
+        self._by_id = {post["id"]: post for post in self.posts}
+
+    def _tree(self, post, number, count, rng):
+        comments, top = {}, []
+        ids = [to_base36(COMMENT_ID_BASE + number * 1000 + k) for k in range(count)]
+        for k, comment_id in enumerate(ids):
+            parent = ids[rng.randrange(k)] if k >= 3 and rng.random() < 0.7 else None
+            comments[comment_id] = {
+                "id": comment_id, "name": f"t1_{comment_id}", "author": rng.choice(AUTHORS),
+                "body": f"Comment {k} on {post['id']}", "score": rng.randint(-5, 100),
+                "created_utc": post["created_utc"] + k * 60, "link_id": post["name"],
+                "parent_id": f"t1_{parent}" if parent else post["name"], "subreddit": self.name,
+                "permalink": f"{post['permalink']}{comment_id}/", "children": [],
+            }
+            (comments[parent]["children"] if parent else top).append(comment_id)
+        return comments, top
+
+    def post(self, post_id):
+        return self._by_id.get(post_id)
+
+    def info(self, post_id):
+        """The post with this ID as api/info returns it, which may be another subreddit's, or None."""
+        if post_id in self._by_id or not self.shared_ids:
+            return self._by_id.get(post_id)
+        number = int(post_id, 36)
+        if not 0 < number < self._newest_id:
+            return None
+        return {"id": post_id, "name": f"t3_{post_id}", "title": "Elsewhere", "author": AUTHORS[0],
+                "subreddit": OTHER_SUBREDDIT, "permalink": f"/r/{OTHER_SUBREDDIT}/comments/{post_id}/elsewhere/",
+                "created_utc": float(int(max(self.now - (self._newest_id - number) * self._seconds_per_id, 0))),
+                "num_comments": 0, "is_self": True}
+
+    def user_comments(self, username):
+        """The user's comments anywhere in the subreddit, newest first."""
+        found = [comment for comments, _ in self.trees.values() for comment in comments.values() if comment["author"] == username]
+        return sorted(found, key=lambda comment: comment["created_utc"], reverse=True)
+
+    def _comment(self, comments, comment_id, depth, replies):
+        data = {key: value for key, value in comments[comment_id].items() if key != "children"}
+        data.update(depth=depth, replies=replies)
+        return {"kind": "t1", "data": data}
+
+    def _more(self, parent_name, depth, children):
+        """A "load more comments" stub, or a "continue this thread" stub without ``children``."""
+        more_id = children[0] if children else "_"
+        return {"kind": "more", "data": {"count": len(children), "name": f"t1_{more_id}", "id": more_id,
+                                         "parent_id": parent_name, "depth": depth, "children": children}}
+
+    def render(self, post_id, comment_ids, depth, parent_name):
+        """A level of the comment tree as /comments returns it: nested replies and stubs."""
+        comments = self.trees[post_id][0]
+        rendered = []
+        for comment_id in comment_ids[:INLINE_REPLIES]:
+            children = comments[comment_id]["children"]
+            if not children:
+                replies = ""
+            elif depth + 1 >= MAX_DEPTH:
+                replies = listing([self._more(f"t1_{comment_id}", depth + 1, [])])
+            else:
+                replies = listing(self.render(post_id, children, depth + 1, f"t1_{comment_id}"))
+            rendered.append(self._comment(comments, comment_id, depth, replies))
+        if comment_ids[INLINE_REPLIES:]:
+            rendered.append(self._more(parent_name, depth, comment_ids[INLINE_REPLIES:]))
+        return rendered
+
+    def flat(self, post_id, comment_id, depth):
+        """A comment and its inline replies as api/morechildren returns them: a flat list with stubs."""
+        comments = self.trees[post_id][0]
+        things = [self._comment(comments, comment_id, depth, "")]
+        children = comments[comment_id]["children"]
+        if children and depth + 1 >= MAX_DEPTH:
+            things.append(self._more(f"t1_{comment_id}", depth + 1, []))
+        elif children:
+            for child in children[:INLINE_REPLIES]:
+                things += self.flat(post_id, child, depth + 1)
+            if children[INLINE_REPLIES:]:
+                things.append(self._more(f"t1_{comment_id}", depth + 1, children[INLINE_REPLIES:]))
+        return things
+
+    def depth(self, post_id, comment_id):
+        comments = self.trees[post_id][0]
+        depth = 0
+        while comments[comment_id]["parent_id"].startswith("t1_"):
+            comment_id = comments[comment_id]["parent_id"][3:]
+            depth += 1
+        return depth
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    """HTTP server answering the downloaders' Reddit API requests from a SyntheticSubreddit.
+
+    Unlike a replay server it can answer any listing cursor, so it also
+    serves runs whose requests were never recorded, such as resumed ones.
+    ``latency`` seconds are added to every response, and ``paths`` counts
+    the requests per path.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, subreddit, address=("127.0.0.1", 0), latency=0.0, verbose=False):
+        super().__init__(address, SyntheticHandler)
+        self.subreddit = subreddit
+        self.latency = latency
+        self.verbose = verbose
+        self.paths = collections.Counter() # Requests per path, without the trailing slash
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves on a background thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _page(self, items, params):
+        """One page of a listing of ``items`` (API things), following its limit and after parameters."""
+        limit = int(params.get("limit", 25))
+        start = 0
+        if params.get("after"):
+            names = [item["data"]["name"] for item in items]
+            start = names.index(params["after"]) + 1 if params["after"] in names else len(items)
+        page = items[start:start + limit]
+        after = page[-1]["data"]["name"] if page and start + limit < len(items) else None
+        return listing(page, after)
+
+    def respond(self, method, path, params, data):
+        """Returns (status, body) for one request."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.paths[path.rstrip("/")] += 1
+        subreddit = self.subreddit
+        parts = path.strip("/").split("/")
+        posts = [{"kind": "t3", "data": post} for post in subreddit.posts]
+        if path.rstrip("/") == TOKEN_PATH:
+            return 200, TOKEN_RESPONSE
+        if parts == ["api", "v1", "me"]:
+            return 200, {"name": "synthetic", "id": "synthetic"}
+        if parts[:2] == ["r", subreddit.name] and parts[2:] == ["new"]:
+            return 200, self._page(posts, params)
+        if parts[:2] == ["r", subreddit.name] and parts[2:] == ["search"]:
+            match = AUTHOR_QUERY.search(params.get("q", ""))
+            author = match.group(1) if match else None
+            return 200, self._page([post for post in posts if post["data"]["author"] == author], params)
+        if parts[0] == "user" and parts[2:] == ["submitted"]:
+            return 200, self._page([post for post in posts if post["data"]["author"] == parts[1]], params)
+        if parts[0] == "user" and parts[2:] == ["comments"]:
+            comments = [{"kind": "t1", "data": dict({key: value for key, value in comment.items() if key != "children"}, replies="")}
+                        for comment in subreddit.user_comments(parts[1])]
+            return 200, self._page(comments, params)
+        if parts[0] == "comments" and subreddit.post(parts[1]) is not None:
+            post = subreddit.post(parts[1])
+            comments, top = subreddit.trees[post["id"]]
+            if len(parts) == 4 and parts[2] == "_" and parts[3] in comments:
+                # "Continue this thread": the comment and its replies, rendered from depth 0
+                comment_id = parts[3]
+                children = comments[comment_id]["children"]
+                replies = listing(subreddit.render(post["id"], children, 1, f"t1_{comment_id}")) if children else ""
+                return 200, [listing([{"kind": "t3", "data": post}]), listing([subreddit._comment(comments, comment_id, 0, replies)])]
+            return 200, [listing([{"kind": "t3", "data": post}]), listing(subreddit.render(post["id"], top, 0, post["name"]))]
+        if parts == ["api", "info"]:
+            found = (subreddit.info(fullname[3:]) for fullname in params.get("id", "").split(",") if fullname.startswith("t3_"))
+            return 200, listing([{"kind": "t3", "data": post} for post in found if post is not None])
+        if parts == ["api", "morechildren"] and method == "POST":
+            post_id = data.get("link_id", "")[3:]
+            if subreddit.post(post_id) is not None:
+                things = []
+                for comment_id in data.get("children", "").split(","):
+                    if comment_id in subreddit.trees[post_id][0]:
+                        things += subreddit.flat(post_id, comment_id, subreddit.depth(post_id, comment_id))
+                return 200, {"json": {"errors": [], "data": {"things": things}}}
+        if self.verbose:
+            print(f"No synthetic response for {method} {path}")
+        return 404, {"message": "Not Found", "error": 404}
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Headers and body are written separately
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ""
+        status, payload = self.server.respond(self.command, url.path, dict(parse_qsl(url.query)), dict(parse_qsl(body)))
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def default_date_range(now):
+    """The seven full UTC days before the day of ``now``, as YYYY-MM-DD strings."""
+    today = datetime.fromtimestamp(now, timezone.utc).date()
+    return (today - timedelta(days=7)).isoformat(), (today - timedelta(days=1)).isoformat()
+
+
+def scenario_runs(subreddit, user, days, date_range):
+    """Engine arguments of every run recorded into the cassette.
+
+    Each scenario is recorded in full, with replace_more() (--hydrate-workers 0)
+    and with --posts-only, so the benchmark can run any of those modes.
+    """
+    start_date, end_date = date_range
+    targets = [
+        ["--subreddit", subreddit, "--days", str(days), "--user", user, "--user-subreddit", subreddit],
+        ["--subreddit", subreddit, "--start-date", start_date, "--end-date", end_date],
+    ]
+    modes = [[], ["--hydrate-workers", "0"], ["--posts-only"]]
+    return [target + mode for target in targets for mode in modes]
+
+
+def record_cassette(cassette_path, subreddit, user=AUTHORS[0], days=DEFAULT_DAYS, date_range=None, verbose=False):
+    """Records every scenario run against a SyntheticServer of ``subreddit`` into one cassette.
+
+    Returns the number of recorded exchanges.
+    """
+    date_range = date_range or default_date_range(subreddit.now)
+    server = SyntheticServer(subreddit, verbose=verbose).start()
+    env = replay_environment(server.url)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir, open(cassette_path, 'wb') as cassette:
+            for number, arguments in enumerate(scenario_runs(subreddit.name, user, days, date_range)):
+                part = os.path.join(work_dir, f"part{number}.cassette.gz")
+                subprocess.run(
+                    [sys.executable, ENGINE, *arguments, "--output-dir", work_dir, "--record", part,
+                     "--rate-limit", str(UNLIMITED_REQUESTS_PER_MINUTE)],
+                    env=env, check=True, stdout=None if verbose else subprocess.DEVNULL,
+                )
+                # Gzip members can simply be concatenated
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, cassette)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return sum(len(exchanges) for exchanges in load_cassette(cassette_path).values())
+
+
+def main():
+    """Main function to parse arguments and record a synthetic cassette."""
+    parser = argparse.ArgumentParser(description="Record a cassette of a generated subreddit for reddit_replay.py and reddit_benchmark.py, without network access.")
+    parser.add_argument("cassette", help="Cassette file to write.")
+    parser.add_argument("--subreddit", default=DEFAULT_SUBREDDIT, help=f"Name of the generated subreddit. Defaults to {DEFAULT_SUBREDDIT}.")
+    parser.add_argument("--user", default=AUTHORS[0], choices=AUTHORS, help=f"User of the recorded user scenario. Defaults to {AUTHORS[0]}.")
+    parser.add_argument("--posts", type=int, default=DEFAULT_POSTS, help=f"Posts in the subreddit. Defaults to {DEFAULT_POSTS}.")
+    parser.add_argument("--max-comments", type=int, default=DEFAULT_MAX_COMMENTS, help=f"Most comments per post (up to 999). Defaults to {DEFAULT_MAX_COMMENTS}.")
+    parser.add_argument("--hours-between-posts", type=float, default=DEFAULT_HOURS_BETWEEN_POSTS, help=f"Hours between consecutive posts, the newest being posted now. Defaults to {DEFAULT_HOURS_BETWEEN_POSTS}.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"Window of the recorded last-N-days scenario. Defaults to {DEFAULT_DAYS}.")
+    parser.add_argument("--date-range", nargs=2, default=None, metavar=("START", "END"), help="Dates (YYYY-MM-DD) of the recorded date-range scenario. Defaults to the seven days before today.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated posts and comments. Defaults to 0.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the recorded runs' output and every request the server cannot answer.")
+    args = parser.parse_args()
+
+    if not 0 <= args.max_comments <= 999:
+        parser.error("--max-comments must be between 0 and 999.")
+
+    subreddit = SyntheticSubreddit(args.subreddit, args.posts, args.max_comments, args.hours_between_posts, seed=args.seed)
+    date_range = args.date_range or default_date_range(subreddit.now)
+    print(f"Generated r/{subreddit.name}: {len(subreddit.posts)} posts and {sum(post['num_comments'] for post in subreddit.posts)} comments.")
+    exchanges = record_cassette(args.cassette, subreddit, args.user, args.days, date_range, args.verbose)
+    print(f"Recorded {exchanges} API exchanges to {args.cassette}")
+    print(f"Benchmark it with: python reddit_benchmark.py {args.cassette} --subreddit {subreddit.name} "
+          f"--date-range {subreddit.name} {date_range[0]} {date_range[1]} --user {args.user} --user-subreddit {subreddit.name}")
+
+if __name__ == "__main__":
+    main()
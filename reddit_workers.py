@@ -0,0 +1,337 @@
+"""
+Helpers for fetching comment trees concurrently.
+
+Every Reddit session created for a run shares one RateBudget, so a pool of
+comment-fetch workers never goes over the per-client request quota. The
+budget is paced from Reddit's X-Ratelimit-* response headers, and a
+SharedRateBudget keeps its state in a locked file so several processes
+using the same client ID draw from one bucket instead of colliding.
+"""
+
+import collections
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+SHARED_BUDGET_SUPPORTED = fcntl is not None
+
+# Reddit allows 100 OAuth requests per minute per client ID (averaged over a
+# ten minute window), so a short burst above the steady rate is tolerated.
+DEFAULT_REQUESTS_PER_MINUTE = 100
+DEFAULT_BURST = 10
+
+RESERVE_REQUESTS = 5 # Left unused in every window for requests already in flight
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0 # Seconds; doubles with every retry
+BACKOFF_CAP = 60.0
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a Retry-After header."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    try:
+        return max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        return delay
+
+
+class RateBudget:
+    """Thread-safe token bucket shared by every session of a run.
+
+    It starts at ``requests_per_minute`` and is re-paced from the rate-limit
+    headers of every response, so the requests left in Reddit's window are
+    spread evenly over the time until it resets. ``max_requests_per_minute``
+    caps the pace regardless of what the headers allow.
+    """
+
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST, max_requests_per_minute=None):
+        self.rate = requests_per_minute / 60.0
+        self.max_rate = max_requests_per_minute / 60.0 if max_requests_per_minute else None
+        if self.max_rate is not None:
+            self.rate = min(self.rate, self.max_rate)
+        self.burst = burst
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._tokens = float(burst)
+        self._updated = self._clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        """Guards the bucket state (and, in SharedRateBudget, loads and stores it)."""
+        with self._lock:
+            yield
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + max(now - self._updated, 0) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Takes one token and returns the seconds to wait before using it (asyncio callers sleep themselves)."""
+        with self._state():
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            # A negative balance reserves a future slot for this caller
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            delay = max(delay, self._paused_until - now)
+            self.requests += 1
+            self.waited += max(delay, 0)
+        return max(delay, 0.0)
+
+    def acquire(self):
+        """Takes one token, sleeping until it is available."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def wait_estimate(self):
+        """Seconds a request made now would wait for its token (without taking it)."""
+        with self._state():
+            now = self._clock()
+            tokens = min(self.burst, self._tokens + max(now - self._updated, 0) * self.rate)
+            delay = (1 - tokens) / self.rate if tokens < 1 else 0.0
+            return max(delay, self._paused_until - now, 0.0)
+
+    def pause(self, seconds):
+        """Holds every caller back for ``seconds`` after a 429."""
+        with self._state():
+            self.retries += 1
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def update(self, headers):
+        """Re-paces the budget from a response's X-Ratelimit-Remaining/Reset headers."""
+        try:
+            remaining = float(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return # Cached responses and some endpoints carry no rate-limit headers
+        with self._state():
+            now = self._clock()
+            self._refill(now)
+            usable = remaining - RESERVE_REQUESTS
+            if usable < 1:
+                # Window used up: wait for it to reset
+                self._paused_until = max(self._paused_until, now + reset + 1)
+                return
+            self.rate = usable / max(reset, 1.0)
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+            self._tokens = min(self._tokens, usable)
+
+    def summary(self):
+        return (f"Rate budget: {self.requests} requests, {self.retries} retries "
+                f"({self.throttled} throttled), {self.waited:.1f}s spent waiting, "
+                f"pace at the end {self.rate * 60:.0f} requests/minute.")
+
+
+class SharedRateBudget(RateBudget):
+    """RateBudget whose bucket lives in a file, shared by every process that uses the same path.
+
+    Each update takes an exclusive lock on the file, so processes sharing a
+    client ID pace themselves as one. Requires fcntl (Unix-like systems).
+    """
+
+    _clock = staticmethod(time.time) # Comparable between processes
+
+    def __init__(self, path, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST, max_requests_per_minute=None):
+        super().__init__(requests_per_minute, burst, max_requests_per_minute)
+        self.path = path
+        self._file = open(path, 'a+', encoding='utf-8')
+
+    @contextmanager
+    def _state(self):
+        with self._lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._file.seek(0)
+                data = self._file.read()
+                if data:
+                    state = json.loads(data)
+                    self.rate = state["rate"]
+                    self._tokens = state["tokens"]
+                    self._updated = state["updated"]
+                    self._paused_until = state["paused_until"]
+                yield
+                state = {"rate": self.rate, "tokens": self._tokens, "updated": self._updated, "paused_until": self._paused_until}
+                self._file.seek(0)
+                self._file.truncate()
+                self._file.write(json.dumps(state))
+                self._file.flush()
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def close(self):
+        self._file.close()
+
+
+class BudgetedSession:
+    """Wraps a requests.Session so every request takes a token from a RateBudget.
+
+    Responses feed their rate-limit headers back into the budget. A 429
+    pauses the whole budget and a 5xx sleeps this caller, both with jittered
+    exponential backoff, before retrying up to MAX_RETRIES times.
+
+    Pass it to PRAW as ``requestor_kwargs={"session": BudgetedSession(budget)}``.
+    """
+
+    def __init__(self, budget, session=None):
+        self._budget = budget
+        self._session = session or requests.Session()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            self._budget.acquire()
+            response = self._session.request(*args, **kwargs)
+            self._budget.update(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("retry-after"))
+            if response.status_code == 429:
+                self._budget.pause(delay)
+            else:
+                self._budget.count_retry()
+                time.sleep(delay)
+            attempt += 1
+
+
+class OrderedMapPool:
+    """Maps functions over items in order on a bounded thread pool that lives as long as the engine.
+
+    Threads are reused from call to call, so thread-local state such as each
+    thread's Reddit instance (see ClientPool) is created once per thread
+    instead of once per call. With ``workers <= 1`` calls run inline.
+    """
+
+    def __init__(self, workers=1):
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def map(self, function, items):
+        """Yields ``function(item)`` for each item in order, with up to ``workers`` calls running at once."""
+        if self._executor is None:
+            for item in items:
+                yield function(item)
+            return
+
+        pending = collections.deque()
+        try:
+            for item in items:
+                pending.append(self._executor.submit(function, item))
+                if len(pending) >= self._workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending: # Abandoned by the caller
+                future.cancel()
+
+
+class CommentFetchPool:
+    """Fetches comment trees for listed submissions on a bounded worker pool.
+
+    PRAW objects are not thread-safe, so for every submission a worker asks
+    ``reddit_factory`` for a Reddit instance of its own thread (see
+    ClientPool.reddit) and re-fetches the submission by ID there. With
+    ``workers <= 1`` comments are fetched inline on the listing object,
+    exactly like the original sequential loop, unless ``rebind`` asks for
+    the factory's instance anyway (to spread the work over several accounts).
+    """
+
+    def __init__(self, reddit_factory, fetch_comments, workers=1, rebind=False):
+        self._reddit_factory = reddit_factory
+        self._fetch_comments = fetch_comments
+        self._workers = workers
+        self._rebind = rebind
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _fetch_by_id(self, submission_id):
+        submission = self._reddit_factory().submission(id=submission_id)
+        return self._fetch_comments(submission)
+
+    def imap(self, submissions, stored_comments=None):
+        """Yields (submission, get_comments) pairs in listing order.
+
+        ``get_comments()`` returns the comment list for that submission (or
+        raises its fetch error). At most ``2 * workers`` fetches are in flight,
+        so the listing never runs far ahead of the output. If
+        ``stored_comments(submission)`` returns a list, that list is reused and
+        nothing is fetched for the submission.
+        """
+        if self._executor is None:
+            for submission in submissions:
+                comments = stored_comments(submission) if stored_comments else None
+                if comments is not None:
+                    yield submission, (lambda c=comments: c)
+                elif self._rebind:
+                    yield submission, (lambda s=submission: self._fetch_by_id(s.id))
+                else:
+                    yield submission, (lambda s=submission: self._fetch_comments(s))
+            return
+
+        pending = collections.deque()
+        listing_error = None
+        try:
+            for submission in submissions:
+                comments = stored_comments(submission) if stored_comments else None
+                if comments is not None:
+                    future = Future()
+                    future.set_result(comments)
+                else:
+                    future = self._executor.submit(self._fetch_by_id, submission.id)
+                pending.append((submission, future))
+                if len(pending) >= 2 * self._workers:
+                    submission, future = pending.popleft()
+                    yield submission, future.result
+        except Exception as e:
+            # Hand out the fetches already in flight before reporting the listing error
+            listing_error = e
+        while pending:
+            submission, future = pending.popleft()
+            yield submission, future.result
+        if listing_error is not None:
+            raise listing_error
@@ -0,0 +1,88 @@
+"""
+Fixtures shared by the tests: a synthetic cassette recorded once per session
+(see reddit_synthetic.py), replay servers serving it on localhost and the
+synthetic server itself, for runs whose requests cannot be recorded ahead.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from reddit_replay import ReplayServer, replay_environment
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit, record_cassette
+
+SUBREDDIT = "synthetic"
+USER = "alice"
+POSTS = 250
+MAX_COMMENTS = 12
+DATE_RANGE_DAYS = 20
+UNLIMITED_REQUESTS_PER_MINUTE = "1000000" # Let the replay server do the pacing
+
+
+@pytest.fixture(scope="session")
+def subreddit():
+    return SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS)
+
+
+@pytest.fixture(scope="session")
+def date_range(subreddit):
+    """(start, end) dates of the recorded date-range scenario: the DATE_RANGE_DAYS days before today."""
+    today = datetime.fromtimestamp(subreddit.now, timezone.utc).date()
+    return (today - timedelta(days=DATE_RANGE_DAYS)).isoformat(), (today - timedelta(days=1)).isoformat()
+
+
+@pytest.fixture(scope="session")
+def cassette(tmp_path_factory, subreddit, date_range):
+    path = str(tmp_path_factory.mktemp("cassette") / "synthetic.cassette.gz")
+    record_cassette(path, subreddit, USER, date_range=date_range)
+    return path
+
+
+@pytest.fixture
+def replay(cassette):
+    """A replay server of the synthetic cassette, with fresh counters for every test."""
+    server = ReplayServer(cassette).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def synthetic_server(subreddit):
+    """The subreddit of the cassette served live: it answers any request, recorded or not."""
+    server = SyntheticServer(subreddit).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def downloader(server, script, *arguments, accounts=1):
+    """Command line and environment that run a downloader script against ``server`` with ``accounts`` fake accounts."""
+    command = [sys.executable, os.path.join(ROOT, script), *map(str, arguments), "--rate-limit", UNLIMITED_REQUESTS_PER_MINUTE]
+    return command, replay_environment(server.url, accounts)
+
+
+def run_downloader(server, script, *arguments, accounts=1):
+    """Runs a downloader script against ``server`` to completion; returns the CompletedProcess."""
+    command, env = downloader(server, script, *arguments, accounts=accounts)
+    completed = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert completed.returncode == 0, completed.stderr
+    return completed
+
+
+def output_bytes(path):
+    """The output file's bytes with its header's download_time blanked, since it differs between runs."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(".ndjson"):
+        header = json.loads(data.split(b"\n", 1)[0])
+    else:
+        header = json.loads(data)
+    return data.replace(header["download_time"].encode('utf-8'), b"")
@@ -0,0 +1,50 @@
+"""
+Work is spread over every account of the pool, moves away from an account
+while Reddit throttles it, and the output stays the same as with one account.
+"""
+
+import pytest
+
+from conftest import SUBREDDIT, output_bytes, run_downloader
+from reddit_replay import ReplayServer
+
+ACCOUNTS = 3
+CLIENTS = [f"replay{number}" for number in range(1, ACCOUNTS + 1)]
+THROTTLED = CLIENTS[1]
+THROTTLED_LIMIT = 10 # Requests per window for the throttled client; the others are not limited
+WINDOW = 5 # Seconds
+
+
+@pytest.fixture
+def throttling_replay(cassette):
+    """A replay server that rate-limits one of the accounts to THROTTLED_LIMIT requests per WINDOW seconds."""
+    server = ReplayServer(cassette, window=WINDOW, client_rate_limits={THROTTLED: THROTTLED_LIMIT}).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run(server, tmp_path, name, accounts):
+    output = str(tmp_path / f"{name}.ndjson")
+    run_downloader(server, "reddit_subreddit_downloader.py", "--subreddit", SUBREDDIT, "--format", "ndjson",
+                   "--workers", 6, "-o", output, accounts=accounts)
+    assert server.unmatched == 0
+    return output_bytes(output)
+
+
+def test_work_is_spread_over_every_account(replay, tmp_path):
+    reference = run(replay, tmp_path, "one_account", 1)
+    replay.reset_counters()
+    assert run(replay, tmp_path, "pool", ACCOUNTS) == reference
+
+    requests = [replay.client_requests[client] for client in CLIENTS]
+    assert min(requests) > sum(requests) / ACCOUNTS / 2, requests
+
+
+def test_work_moves_away_from_a_throttled_account(throttling_replay, tmp_path):
+    reference = run(throttling_replay, tmp_path, "one_account", 1)
+    throttling_replay.reset_counters()
+    assert run(throttling_replay, tmp_path, "pool", ACCOUNTS) == reference
+
+    others = [throttling_replay.client_requests[client] for client in CLIENTS if client != THROTTLED]
+    assert throttling_replay.client_requests[THROTTLED] < min(others) / 2, throttling_replay.summary()
@@ -0,0 +1,69 @@
+"""
+The archive keeps each comment's parent_id, which the output layouts leave
+out, and exports comment trees in the order of the latest fetch.
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from conftest import MAX_COMMENTS, POSTS, ROOT, SUBREDDIT, run_downloader
+from reddit_output import read_posts
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit
+
+
+@pytest.mark.parametrize("output_format", ["ndjson", "parquet"])
+def test_only_the_archive_keeps_parent_ids(synthetic_server, tmp_path, output_format):
+    output = str(tmp_path / f"posts.{output_format}")
+    archive = str(tmp_path / "archive.db")
+    run_downloader(synthetic_server, "reddit_subreddit_downloader.py", "--subreddit", SUBREDDIT, "--format", output_format,
+                   "--archive", archive, "-o", output)
+
+    posts = list(read_posts(output))
+    comments = [comment for post in posts for comment in post["comments"]]
+    assert comments and not [comment for comment in comments if "parent_id" in comment]
+
+    db = sqlite3.connect(archive)
+    parents = dict(db.execute("SELECT id, parent_id FROM comments"))
+    db.close()
+    assert len(parents) == len(comments)
+    post_names = {f"t3_{post['id']}" for post in posts}
+    assert all(parent in post_names or parent[3:] in parents for parent in parents.values())
+
+
+def test_export_follows_the_latest_fetch_order(synthetic_server, subreddit, tmp_path):
+    archive = str(tmp_path / "archive.db")
+    first = str(tmp_path / "first.ndjson")
+    run_downloader(synthetic_server, "reddit_subreddit_downloader.py", "--subreddit", SUBREDDIT, "--format", "ndjson",
+                   "--archive", archive, "-o", first)
+    # The same posts and comment IDs, but every tree has a different size and shape
+    changed = SyntheticServer(SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS, now=subreddit.now, seed=1)).start()
+    try:
+        second = str(tmp_path / "second.ndjson")
+        run_downloader(changed, "reddit_subreddit_downloader.py", "--subreddit", SUBREDDIT, "--format", "ndjson",
+                       "--archive", archive, "-o", second)
+    finally:
+        changed.shutdown()
+        changed.server_close()
+
+    exported = str(tmp_path / "export.json")
+    subprocess.run([sys.executable, os.path.join(ROOT, "reddit_archive.py"), "export", archive, "-o", exported, "--subreddit", SUBREDDIT],
+                   check=True, stdout=subprocess.DEVNULL)
+    with open(exported, encoding='utf-8') as f:
+        exported_posts = {post["id"]: post for post in json.load(f)["posts"]}
+
+    first_comments = {post["id"]: [comment["id"] for comment in post["comments"]] for post in read_posts(first)}
+    gone = 0
+    for post in read_posts(second):
+        latest = [comment["id"] for comment in post["comments"]]
+        if not latest:
+            continue
+        # The latest tree in fetch order, then the comments that are no longer in it
+        vanished = sorted(set(first_comments[post["id"]]) - set(latest))
+        assert [comment["id"] for comment in exported_posts[post["id"]]["comments"]] == latest + vanished
+        gone += len(vanished)
+    assert gone
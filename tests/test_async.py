@@ -0,0 +1,29 @@
+"""The --async fetcher writes the same records, byte for byte, as the threaded one."""
+
+import hashlib
+
+import pytest
+
+from conftest import SUBREDDIT, USER, output_bytes, run_downloader
+from reddit_async import ASYNC_SUPPORTED
+
+pytestmark = pytest.mark.skipif(not ASYNC_SUPPORTED, reason="--async needs Async PRAW (pip install asyncpraw)")
+
+
+def digest(path):
+    return hashlib.sha256(output_bytes(path)).hexdigest()
+
+
+@pytest.mark.parametrize("script, arguments", [
+    ("reddit_subreddit_downloader.py", ["--subreddit", SUBREDDIT, "--format", "ndjson"]),
+    ("reddit_subreddit_downloader.py", ["--subreddit", SUBREDDIT, "--format", "json", "--hydrate-workers", "0"]),
+    ("reddit_downloader.py", [USER, "--subreddit", SUBREDDIT, "--include-comments"]),
+])
+def test_async_output_matches_the_threaded_output(synthetic_server, tmp_path, script, arguments):
+    extension = "ndjson" if "ndjson" in arguments else "json"
+    threaded = str(tmp_path / f"threaded.{extension}")
+    run_downloader(synthetic_server, script, *arguments, "--workers", "4", "-o", threaded)
+    asynchronous = str(tmp_path / f"async.{extension}")
+    run_downloader(synthetic_server, script, *arguments, "--workers", "32", "--async", "-o", asynchronous)
+
+    assert digest(asynchronous) == digest(threaded)
@@ -0,0 +1,23 @@
+"""Every downloader exits with a non-zero status when its target fails."""
+
+import subprocess
+
+import pytest
+
+from conftest import SUBREDDIT, USER, downloader
+
+MISSING_DIRECTORY = "missing" # The output cannot be written, so every fetch fails
+
+
+@pytest.mark.parametrize("script, arguments", [
+    ("reddit_subreddit_downloader.py", ["--subreddit", SUBREDDIT, "-o", f"{MISSING_DIRECTORY}/out.json"]),
+    ("reddit_subreddit_downloader_daterange.py", ["--subreddit", SUBREDDIT, "--start-date", "2024-01-01", "--end-date", "2024-01-31", "--no-checkpoint", "-o", f"{MISSING_DIRECTORY}/out.json"]),
+    ("reddit_subreddit_downloader_daterange.py", ["--subreddit", SUBREDDIT, "--start-date", "2024-01-01", "--end-date", "2024-01-31", "-o", f"{MISSING_DIRECTORY}/out.json"]),
+    ("reddit_downloader.py", [USER, "--subreddit", SUBREDDIT, "-o", f"{MISSING_DIRECTORY}/out.json"]),
+    ("reddit_engine.py", ["--subreddit", SUBREDDIT, "--output-dir", MISSING_DIRECTORY]),
+])
+def test_failed_fetch_exits_non_zero(synthetic_server, tmp_path, script, arguments):
+    command, env = downloader(synthetic_server, script, *arguments, "--posts-only")
+    completed = subprocess.run(command, env=env, cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert "An error occurred while fetching data" in completed.stderr
+    assert completed.returncode == 1
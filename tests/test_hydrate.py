@@ -0,0 +1,39 @@
+"""Batched comment hydration flattens every tree exactly as replace_more() and comments.list() do."""
+
+import pytest
+
+from conftest import SUBREDDIT, run_downloader
+from reddit_output import read_posts
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit
+
+POSTS = 40
+MAX_COMMENTS = 300 # Large enough for several "load more comments" and "continue this thread" stubs per tree
+MORECHILDREN_PATH = "/api/morechildren"
+
+
+@pytest.fixture(scope="module")
+def large_trees_server():
+    server = SyntheticServer(SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("workers", ["1", "4"])
+def test_batched_hydration_matches_replace_more(large_trees_server, tmp_path, workers):
+    arguments = ["--subreddit", SUBREDDIT, "--format", "ndjson", "--workers", workers]
+    large_trees_server.paths.clear()
+    expanded = tmp_path / "replace_more.ndjson"
+    run_downloader(large_trees_server, "reddit_subreddit_downloader.py", *arguments, "--hydrate-workers", "0", "-o", expanded)
+    one_at_a_time = large_trees_server.paths[MORECHILDREN_PATH]
+
+    large_trees_server.paths.clear()
+    hydrated = tmp_path / "hydrated.ndjson"
+    run_downloader(large_trees_server, "reddit_subreddit_downloader.py", *arguments, "-o", hydrated)
+
+    posts = list(read_posts(str(hydrated)))
+    assert posts == list(read_posts(str(expanded)))
+    assert all(len(post["comments"]) == post["num_comments"] for post in posts)
+    # Both kinds of stub had to be resolved
+    assert one_at_a_time and large_trees_server.paths[MORECHILDREN_PATH]
+    assert [path for path in large_trees_server.paths if "/_/" in path]
@@ -0,0 +1,50 @@
+"""
+An --incremental run skips the threads whose comment count did not change,
+refetches the others and adds new posts, and its output is the same as a
+full run's.
+"""
+
+import re
+
+from conftest import MAX_COMMENTS, POSTS, SUBREDDIT, run_downloader
+from reddit_output import read_posts
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit
+
+NEW = 5 # Posts published between the two runs
+CHANGED = 7 # Threads whose comment count changed between the two runs
+
+
+def fetched_threads(server):
+    """Comment trees requested from the server, without "continue this thread" requests."""
+    return sum(count for path, count in server.paths.items() if path.startswith("/comments/") and "/_/" not in path)
+
+
+def test_incremental_run_counts_and_output(subreddit, tmp_path):
+    changing = SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS, now=subreddit.now)
+    posts = changing.posts
+    server = SyntheticServer(changing).start()
+    try:
+        output = str(tmp_path / "posts.ndjson")
+        arguments = ["--subreddit", SUBREDDIT, "--format", "ndjson", "-o", output]
+        changing.posts = posts[NEW:] # The newest posts are not published yet
+        run_downloader(server, "reddit_subreddit_downloader.py", *arguments)
+        previous = len(list(read_posts(output)))
+
+        changing.posts = list(posts)
+        commented = [number for number, post in enumerate(posts) if number >= NEW and post["num_comments"]][:CHANGED]
+        for number in commented:
+            changing.posts[number] = dict(posts[number], num_comments=posts[number]["num_comments"] + 1)
+        server.paths.clear()
+        incremental = run_downloader(server, "reddit_subreddit_downloader.py", *arguments, "--incremental")
+        refetched = fetched_threads(server)
+
+        reference = str(tmp_path / "reference.ndjson")
+        run_downloader(server, "reddit_subreddit_downloader.py", "--subreddit", SUBREDDIT, "--format", "ndjson", "-o", reference)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    counts = re.search(r"Incremental sync: (\d+) threads skipped, (\d+) refreshed, (\d+) newly added", incremental.stdout)
+    assert tuple(map(int, counts.groups())) == (previous - CHANGED, CHANGED, NEW)
+    assert refetched == CHANGED + NEW
+    assert list(read_posts(output)) == list(read_posts(reference))
@@ -0,0 +1,36 @@
+"""Request counts of --posts-only runs: one listing request per page of posts, nothing else."""
+
+import pytest
+
+from conftest import SUBREDDIT, USER, run_downloader
+from reddit_listing import LISTING_PAGE
+from reddit_output import read_posts
+
+AUTH_PATHS = {"/api/v1/access_token", "/api/v1/me"}
+
+
+@pytest.mark.parametrize("script, arguments, listing_path", [
+    ("reddit_subreddit_downloader.py", ["--subreddit", SUBREDDIT], f"/r/{SUBREDDIT}/new"),
+    ("reddit_downloader.py", [USER, "--subreddit", SUBREDDIT], f"/r/{SUBREDDIT}/search"),
+])
+def test_posts_only_requests_one_listing_page_per_100_posts(replay, tmp_path, script, arguments, listing_path):
+    output = tmp_path / "posts.json"
+    run_downloader(replay, script, *arguments, "--posts-only", "-o", output)
+
+    posts = list(read_posts(str(output)))
+    assert posts and all("comments" not in post for post in posts)
+    # Every page up to the one that ends the walk: a post past the window or a short last page
+    assert replay.paths[listing_path] == len(posts) // LISTING_PAGE + 1
+    assert set(replay.paths) == AUTH_PATHS | {listing_path}
+    assert replay.paths["/api/v1/me"] == 1
+    assert replay.unmatched == 0
+
+
+def test_posts_only_never_fetches_comments_or_info(replay, tmp_path, date_range):
+    output = tmp_path / "posts.ndjson"
+    run_downloader(replay, "reddit_subreddit_downloader_daterange.py", "--subreddit", SUBREDDIT,
+                   "--start-date", date_range[0], "--end-date", date_range[1], "--posts-only", "--format", "ndjson", "-o", output)
+
+    assert list(read_posts(str(output)))
+    assert not [path for path in replay.paths if path.startswith(("/comments/", "/api/info", "/api/morechildren"))]
+    assert replay.unmatched == 0
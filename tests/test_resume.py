@@ -0,0 +1,97 @@
+"""
+Resuming a date-range run that was killed partway gives the same output as an
+uninterrupted run, and a run started without --resume does not overwrite
+the killed run's checkpoint.
+
+The resumed listing continues from a cursor that depends on where the run
+was killed, which no cassette can have recorded, so these runs go to the
+synthetic server that the cassette is recorded from.
+"""
+
+import os
+import re
+import signal
+import subprocess
+import time
+
+import pytest
+
+from conftest import SUBREDDIT, downloader, output_bytes, run_downloader
+
+CHECKPOINT_INTERVAL = 10
+LATENCY = 0.02 # Seconds per response, so the run can be killed well before it ends
+
+
+def wait_for_commit(process, checkpoint_file, timeout=60):
+    """Waits until the checkpoint holds a committed batch of posts (beyond its first line)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert process.poll() is None, "the run finished before it could be interrupted"
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, encoding='utf-8') as f:
+                if len(f.read().splitlines()) > 1:
+                    return
+        time.sleep(0.01)
+    pytest.fail("no checkpoint was committed in time")
+
+
+def killed_run(server, arguments, output):
+    """Starts a run and kills it once its first batch of posts is checkpointed."""
+    server.latency = LATENCY
+    command, env = downloader(server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", output)
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_commit(process, output + ".checkpoint")
+    finally:
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+        server.latency = 0
+    assert process.returncode == -signal.SIGKILL
+
+
+def date_range_arguments(date_range, output_format):
+    return ["--subreddit", SUBREDDIT, "--start-date", date_range[0], "--end-date", date_range[1],
+            "--format", output_format, "--checkpoint-every", CHECKPOINT_INTERVAL]
+
+
+@pytest.mark.parametrize("output_format", ["ndjson", "json"])
+def test_resumed_output_matches_an_uninterrupted_run(synthetic_server, tmp_path, date_range, output_format):
+    arguments = date_range_arguments(date_range, output_format)
+    reference = str(tmp_path / f"reference.{output_format}")
+    run_downloader(synthetic_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", reference)
+
+    output = str(tmp_path / f"resumed.{output_format}")
+    checkpoint_file = output + ".checkpoint"
+    killed_run(synthetic_server, arguments, output)
+    if output_format == "json":
+        assert not os.path.exists(output) and os.path.exists(output + ".partial")
+
+    resumed = run_downloader(synthetic_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", output, "--resume")
+
+    # The posts committed before the kill were skipped, not fetched again
+    completed = int(re.search(r"Resuming after (\d+) completed posts", resumed.stdout).group(1))
+    assert completed >= CHECKPOINT_INTERVAL
+    assert f"Processing post {completed + 1}:" in resumed.stdout and f"Processing post {completed}:" not in resumed.stdout
+    assert output_bytes(output) == output_bytes(reference)
+    assert not os.path.exists(checkpoint_file) and not os.path.exists(output + ".partial")
+
+
+def test_a_run_without_resume_keeps_the_checkpoint(synthetic_server, tmp_path, date_range):
+    arguments = date_range_arguments(date_range, "json")
+    output = str(tmp_path / "posts.json")
+    checkpoint_file = output + ".checkpoint"
+    killed_run(synthetic_server, arguments, output)
+    with open(checkpoint_file, 'rb') as f:
+        checkpoint = f.read()
+
+    command, env = downloader(synthetic_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", output)
+    refused = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert refused.returncode == 1
+    assert "--resume" in refused.stderr and "--restart" in refused.stderr
+    with open(checkpoint_file, 'rb') as f:
+        assert f.read() == checkpoint
+    assert os.path.exists(output + ".partial")
+
+    restarted = run_downloader(synthetic_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", output, "--restart")
+    assert "Discarding the checkpoint" in restarted.stdout and "Processing post 1:" in restarted.stdout
+    assert not os.path.exists(checkpoint_file) and not os.path.exists(output + ".partial")
@@ -0,0 +1,53 @@
+"""
+A date range listed in --slices gives the same posts as one listing paged
+back from the newest post, whether or not the slices' starting posts can be
+found through api/info.
+
+Slices start from cursors that depend on the probed IDs, so these runs go
+to the synthetic server rather than a replay of the cassette.
+"""
+
+import pytest
+
+from conftest import MAX_COMMENTS, POSTS, SUBREDDIT, run_downloader
+from reddit_output import read_posts
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit
+
+SLICES = 4
+LISTING_PATH = f"/r/{SUBREDDIT}/new"
+
+
+@pytest.fixture(params=["dense", "shared"])
+def slices_server(request, subreddit):
+    """The session's subreddit, whose probes find nothing below its first post, or one whose
+    sparse IDs are shared with another subreddit's posts, as on Reddit."""
+    if request.param == "shared":
+        subreddit = SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS, now=subreddit.now, id_spacing=50, shared_ids=True)
+    server = SyntheticServer(subreddit).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_slices_match_an_unsliced_listing(slices_server, tmp_path, date_range):
+    arguments = ["--subreddit", SUBREDDIT, "--start-date", date_range[0], "--end-date", date_range[1], "--format", "ndjson"]
+    reference = tmp_path / "reference.ndjson"
+    run_downloader(slices_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", reference)
+    unsliced_pages = slices_server.paths[LISTING_PATH]
+
+    slices_server.paths.clear()
+    output = tmp_path / "sliced.ndjson"
+    sliced = run_downloader(slices_server, "reddit_subreddit_downloader_daterange.py", *arguments, "-o", output, "--slices", SLICES)
+
+    posts = list(read_posts(str(output)))
+    assert len(posts) > SLICES
+    assert posts == list(read_posts(str(reference)))
+    assert "slices were fully covered" in sliced.stdout
+    if slices_server.subreddit.shared_ids:
+        # Every slice started at its own post: one page each, after the request for the newest post
+        assert f"Splitting the date range into {SLICES} slices." in sliced.stdout
+        assert slices_server.paths[LISTING_PATH] == 1 + SLICES
+    else:
+        # No starting post was found, so the slices were listed together from the newest post
+        assert "listed as 1" in sliced.stdout
+        assert slices_server.paths[LISTING_PATH] == 1 + unsliced_pages
@@ -0,0 +1,41 @@
+"""`reddit_snapshots.py rebuild` gives back every run's JSON output byte for byte."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import MAX_COMMENTS, POSTS, ROOT, SUBREDDIT, USER, run_downloader
+from reddit_synthetic import SyntheticServer, SyntheticSubreddit
+
+RUNS = 3
+CHANGED = 10 # Posts whose score changes between runs
+
+
+@pytest.mark.parametrize("script, arguments", [
+    ("reddit_subreddit_downloader.py", ["--subreddit", SUBREDDIT]),
+    ("reddit_downloader.py", [USER, "--subreddit", SUBREDDIT, "--include-comments"]),
+])
+def test_rebuilt_snapshots_match_the_outputs(subreddit, tmp_path, script, arguments):
+    changing = SyntheticSubreddit(SUBREDDIT, POSTS, MAX_COMMENTS, now=subreddit.now)
+    store = str(tmp_path / "snapshots.db")
+    server = SyntheticServer(changing).start()
+    try:
+        outputs = []
+        for run in range(RUNS):
+            # Every run changes a few scores, and the second also hides the newest post
+            changing.posts = [dict(post, score=post["score"] + run) if number % (POSTS // CHANGED) == 0 else post
+                              for number, post in enumerate(subreddit.posts) if number or run != 1]
+            outputs.append(str(tmp_path / f"run{run}.json"))
+            run_downloader(server, script, *arguments, "--snapshots", store, "-o", outputs[-1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for snapshot, output in enumerate(outputs, 1):
+        rebuilt = str(tmp_path / f"rebuilt{snapshot}.json")
+        subprocess.run([sys.executable, os.path.join(ROOT, "reddit_snapshots.py"), "rebuild", store, str(snapshot), "-o", rebuilt],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(rebuilt, 'rb') as rebuilt_file, open(output, 'rb') as output_file:
+            assert rebuilt_file.read() == output_file.read()
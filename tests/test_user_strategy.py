@@ -0,0 +1,18 @@
+"""The walk strategy finds the same posts of a user as subreddit-scoped search."""
+
+import pytest
+
+from conftest import SUBREDDIT, USER, run_downloader
+from reddit_output import read_posts
+
+
+@pytest.mark.parametrize("mode", [[], ["--posts-only"]])
+def test_walk_finds_the_posts_search_finds(synthetic_server, tmp_path, mode):
+    searched = tmp_path / "search.json"
+    run_downloader(synthetic_server, "reddit_downloader.py", USER, "--subreddit", SUBREDDIT, *mode, "-o", searched)
+    walked = tmp_path / "walk.json"
+    run_downloader(synthetic_server, "reddit_downloader.py", USER, "--subreddit", SUBREDDIT, *mode, "--strategy", "walk", "-o", walked)
+
+    posts = list(read_posts(str(walked)))
+    assert posts and posts == list(read_posts(str(searched)))
+    assert synthetic_server.paths[f"/user/{USER}/submitted"] >= 1